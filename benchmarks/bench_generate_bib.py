@@ -0,0 +1,28 @@
+"""
+Microbenchmark of bib generation throughput.
+
+Run from the project's root directory:
+    python -m benchmarks.bench_generate_bib
+"""
+
+import time
+
+from benchmarks.synthetic import synthetic_items
+from src.producer import BibTemplate, generate_bib
+
+
+def bench(count: int = 5000, repeat: int = 5) -> float:
+    """Returns best records/sec of `repeat` runs over `count` synthetic items"""
+    items = synthetic_items(count)
+    best = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        template = BibTemplate()
+        for n, item in enumerate(items):
+            generate_bib(item, n, template).as_marc()
+        best = max(best, count / (time.perf_counter() - start))
+    return best
+
+
+if __name__ == "__main__":
+    print(f"generate_bib + as_marc: {bench():,.0f} records/sec")
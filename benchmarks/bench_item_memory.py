@@ -0,0 +1,77 @@
+"""
+Memory benchmark of loading a whole sheet into `Item` records.
+
+Compares the slotted `src.reader.Item` with the namedtuple it replaced on a
+synthetic 100k-row sheet. Run from the project's root directory:
+    python -m benchmarks.bench_item_memory
+"""
+
+import csv
+import io
+import random
+import tracemalloc
+from collections import namedtuple
+
+from src.downloader import COL_NAMES
+from src.reader import Item
+
+
+NamedTupleItem = namedtuple("Item", COL_NAMES)
+
+SUBJECTS = [
+    "Power tools",
+    "Hand tools",
+    "Garden tools",
+    "Home improvement",
+    "Woodworking",
+    "Measuring tools",
+    "Cleaning",
+    "Automotive",
+]
+
+
+def synthetic_sheet(rows: int = 100_000, seed: int = 1) -> str:
+    """Returns csv of a mature sheet: mostly completed rows, sparse notes"""
+    rnd = random.Random(seed)
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(COL_NAMES)
+    for n in range(rows):
+        writer.writerow(
+            [
+                "for processing" if rnd.random() < 0.02 else "completed",
+                f"Tool {n}",
+                "",
+                f"SKU{n}" if rnd.random() < 0.5 else "",
+                "A tool for fixing things" if rnd.random() < 0.3 else "",
+                ", ".join(rnd.sample(SUBJECTS, rnd.randint(1, 3))),
+                "",
+                "",
+                "https://example.com/manual.pdf" if rnd.random() < 0.2 else "",
+                f"34444{n:09}",
+                rnd.choice(["9.99", "19.99", "49.99", "149.99"]),
+                rnd.choice(["YES", "NO"]),
+            ]
+        )
+    return out.getvalue()
+
+
+def measure(record_type, sheet: str) -> int:
+    """Returns bytes retained by records of all rows parsed from the sheet"""
+    reader = csv.reader(io.StringIO(sheet))
+    next(reader)
+    tracemalloc.start()
+    items = [record_type._make(row) for row in reader]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(items) > 0
+    return size
+
+
+if __name__ == "__main__":
+    sheet = synthetic_sheet()
+    baseline = measure(NamedTupleItem, sheet)
+    slotted = measure(Item, sheet)
+    print(f"namedtuple Item: {baseline / 2**20:6.1f} MiB")
+    print(f"slotted Item:    {slotted / 2**20:6.1f} MiB")
+    print(f"saved:           {1 - slotted / baseline:6.1%}")
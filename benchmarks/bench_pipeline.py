@@ -0,0 +1,102 @@
+"""
+Time to first record and total time of sequential and pipelined create runs
+over a throttled local stand-in of the Google Sheets CSV export.
+
+Run from the project's root directory:
+    python -m benchmarks.bench_pipeline
+"""
+
+import csv
+import io
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.synthetic import synthetic_items
+from src.downloader import get_metadata
+from src.pipeline import BackgroundWriter, stream_data
+from src.producer import BibTemplate, MarcBatchWriter, generate_bib
+from src.reader import read_data
+
+
+CHUNK_SIZE = 16 * 1024
+
+
+def _sheet(count: int) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["Timestamp", "Status"])
+    for item in synthetic_items(count):
+        writer.writerow(["1/1/2024", *item])
+    return buffer.getvalue().encode("utf-8")
+
+
+class _ThrottledHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = self.server.body
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        for start in range(0, len(body), CHUNK_SIZE):
+            self.wfile.write(body[start : start + CHUNK_SIZE])
+            time.sleep(self.server.delay)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _sequential(url: str) -> tuple[float, float]:
+    start = time.perf_counter()
+    first = None
+    get_metadata(url)
+    template = BibTemplate()
+    with MarcBatchWriter("out/sequential.mrc") as writer:
+        for n, item in enumerate(read_data(status="for processing")):
+            writer.write(generate_bib(item, n, template).as_marc())
+            first = first or time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+def _pipelined(url: str) -> tuple[float, float]:
+    start = time.perf_counter()
+    first = None
+    template = BibTemplate()
+    with MarcBatchWriter("out/pipelined.mrc") as writer:
+        with BackgroundWriter(writer) as background:
+            for n, (_, item) in enumerate(stream_data("for processing", url)):
+                background.write(generate_bib(item, n, template).as_marc())
+                first = first or time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+def bench(count: int = 5000, delay: float = 0.01) -> dict[str, tuple[float, float]]:
+    """
+    Returns (time to first record, total time) of both modes for a sheet of
+    `count` rows sent in chunks `delay` seconds apart.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _ThrottledHandler)
+    server.body = _sheet(count)
+    server.delay = delay
+    url = f"http://127.0.0.1:{server.server_port}/"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    cwd = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.chdir(tmp_dir)
+            os.mkdir("out")
+            results = {"sequential": _sequential(url)}
+            os.remove("out/metadata.csv")
+            results["pipelined"] = _pipelined(url)
+    finally:
+        os.chdir(cwd)
+        server.shutdown()
+        server.server_close()
+    return results
+
+
+if __name__ == "__main__":
+    for mode, (first, total) in bench().items():
+        print(f"{mode:<12} first record: {first:.3f}s, total: {total:.3f}s")
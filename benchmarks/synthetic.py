@@ -0,0 +1,59 @@
+"""Synthetic sheet rows stressing the producer hot path."""
+
+import random
+
+from src.reader import Item
+
+
+SUBJECTS = [
+    "Power tools",
+    "Hand tools",
+    "Garden tools",
+    "Home improvement",
+    "Woodworking",
+    "Measuring tools",
+    "Cleaning",
+    "Automotive",
+    "Plumbing",
+    "Electrical",
+    "Painting",
+    "Outdoor recreation",
+]
+
+SUMMARY = (
+    "a compact cordless drill driver with a brushless motor, two lithium-ion "
+    "batteries, a fast charger and a carrying case; includes a two-speed "
+    "gearbox, an LED work light and a keyless chuck for quick bit changes"
+)
+
+
+def synthetic_items(count: int, seed: int = 1) -> list[Item]:
+    """
+    Returns `count` valid rows. Rows carry up to 8 barcodes, summaries of up
+    to several hundred characters and up to 8 subjects.
+    """
+    rnd = random.Random(seed)
+    items = []
+    barcode = 0
+    for n in range(count):
+        barcodes = []
+        for _ in range(rnd.randint(1, 8)):
+            barcodes.append(f"34444{barcode:09}")
+            barcode += 1
+        items.append(
+            Item(
+                status="for processing",
+                t245=f"Cordless drill {n}",
+                t246="Drill; Power drill" if rnd.random() < 0.5 else "",
+                t028=f"DCD{n:05}; {n:06}B",
+                t520=" ".join([SUMMARY] * rnd.randint(1, 4)),
+                t690=", ".join(rnd.sample(SUBJECTS, rnd.randint(1, 8))),
+                t500="battery included; charger included.",
+                t505="drill, 2 batteries, charger, case",
+                t856="https://example.com/manual.pdf; https://example.com/quick.pdf",
+                barcode="; ".join(barcodes),
+                cost=rnd.choice(["9", "19.99", "49.5", "149.99"]),
+                loan_restriction=rnd.choice(["YES", "NO", "yes", "no"]),
+            )
+        )
+    return items
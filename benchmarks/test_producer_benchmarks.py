@@ -0,0 +1,119 @@
+"""
+Throughput benchmarks of the producer hot path (pytest-benchmark).
+
+Baselines are specific to a machine and are not kept in the repository. Run
+from the project's root directory, store a baseline before a change with:
+    pytest benchmarks --benchmark-storage=benchmarks/baselines \
+        --benchmark-save=baseline
+
+and compare against it after the change, failing if the mean time of any
+benchmark regresses by more than 15%:
+    pytest benchmarks --benchmark-storage=benchmarks/baselines \
+        --benchmark-compare --benchmark-compare-fail=mean:15%
+"""
+
+import tracemalloc
+
+import pytest
+
+from benchmarks.synthetic import synthetic_items
+from src.producer import (
+    BibTemplate,
+    _barcodes2list,
+    _make_t960,
+    generate_bib,
+)
+
+
+pytest.importorskip("pytest_benchmark")
+
+SIZES = [1_000, 10_000, 100_000]
+
+
+@pytest.fixture(scope="module")
+def items():
+    return synthetic_items(max(SIZES))
+
+
+def _allocations_per_record(func, items) -> dict:
+    tracemalloc.start()
+    try:
+        func(items)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "retained_bytes_per_record": current / len(items),
+        "peak_bytes_per_record": peak / len(items),
+    }
+
+
+def _generate(items):
+    template = BibTemplate()
+    return [generate_bib(item, n, template) for n, item in enumerate(items)]
+
+
+def _generate_and_serialize(items):
+    template = BibTemplate()
+    for n, item in enumerate(items):
+        generate_bib(item, n, template).as_marc()
+
+
+def _record_throughput(benchmark, size):
+    # no stats are collected with --benchmark-disable
+    if benchmark.stats:
+        benchmark.extra_info["records_per_sec"] = size / benchmark.stats.stats.mean
+
+
+def _rounds(size):
+    return max(1, 10_000 // size)
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_generate_bib(benchmark, items, size):
+    batch = items[:size]
+    benchmark.extra_info.update(_allocations_per_record(_generate, batch[:1000]))
+    benchmark.pedantic(_generate, args=(batch,), rounds=_rounds(size))
+    _record_throughput(benchmark, size)
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_generate_and_serialize(benchmark, items, size):
+    batch = items[:size]
+    benchmark.extra_info.update(
+        _allocations_per_record(_generate_and_serialize, batch[:1000])
+    )
+    benchmark.pedantic(_generate_and_serialize, args=(batch,), rounds=_rounds(size))
+    _record_throughput(benchmark, size)
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_as_marc(benchmark, items, size):
+    bibs = _generate(items[:size])
+
+    def serialize():
+        for bib in bibs:
+            bib.as_marc()
+
+    benchmark.pedantic(serialize, rounds=_rounds(size))
+    _record_throughput(benchmark, size)
+
+
+def test_barcodes2list(benchmark, items):
+    cells = [item.barcode for item in items[:1000]]
+
+    def parse():
+        for cell in cells:
+            _barcodes2list(cell)
+
+    benchmark(parse)
+
+
+def test_make_t960(benchmark, items):
+    rows = [(i.barcode, i.cost, i.loan_restriction) for i in items[:1000]]
+
+    def build():
+        for row in rows:
+            _make_t960(*row)
+
+    benchmark(build)
@@ -0,0 +1,102 @@
+"""
+Persistent index of item barcodes kept in a SQLite database under `out/`.
+
+Each barcode is stored with the sheet row it comes from and, once the row
+was crosswalked, the control number of its bib. The barcode cell of each
+indexed row is kept as well so unchanged rows can be skipped on the next run.
+"""
+
+import sqlite3
+from collections.abc import Iterable
+
+
+INDEX_PATH = "out/barcodes.db"
+
+
+class BarcodeIndex:
+    def __init__(self, path: str = INDEX_PATH) -> None:
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS rows (
+                row INTEGER PRIMARY KEY,
+                barcodes TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS barcodes (
+                barcode TEXT PRIMARY KEY,
+                row INTEGER NOT NULL,
+                control_no TEXT
+            );
+            CREATE INDEX IF NOT EXISTS barcodes_row ON barcodes (row);
+            """
+        )
+
+    def __enter__(self) -> "BarcodeIndex":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.conn.commit()
+        else:
+            self.conn.rollback()
+        self.conn.close()
+
+    def indexed_rows(self) -> dict[int, str]:
+        """Returns barcode cell of each indexed row"""
+        return dict(self.conn.execute("SELECT row, barcodes FROM rows"))
+
+    def remove_rows(self, rows: Iterable[int]) -> None:
+        """Drops rows and their barcodes from the index"""
+        params = [(row,) for row in rows]
+        self.conn.executemany("DELETE FROM rows WHERE row = ?", params)
+        self.conn.executemany("DELETE FROM barcodes WHERE row = ?", params)
+
+    def remove_rows_after(self, last_row: int) -> None:
+        """Drops rows that are no longer in the sheet"""
+        self.conn.execute("DELETE FROM rows WHERE row > ?", (last_row,))
+        self.conn.execute("DELETE FROM barcodes WHERE row > ?", (last_row,))
+
+    def owner(self, barcode: str) -> int | None:
+        """Returns row the barcode is indexed under"""
+        result = self.conn.execute(
+            "SELECT row FROM barcodes WHERE barcode = ?", (barcode,)
+        ).fetchone()
+        return result[0] if result else None
+
+    def add_barcodes(self, row: int, barcodes: Iterable[str]) -> None:
+        self.conn.executemany(
+            "INSERT INTO barcodes (barcode, row) VALUES (?, ?)",
+            [(barcode, row) for barcode in barcodes],
+        )
+
+    def mark_indexed(self, row: int, cell: str) -> None:
+        """Records row's barcode cell so the row is skipped until it changes"""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO rows (row, barcodes) VALUES (?, ?)", (row, cell)
+        )
+
+    def record_bib(
+        self, row: int, cell: str, barcodes: list[str], control_no: str
+    ) -> list[str]:
+        """
+        Indexes barcodes of a crosswalked row under its control number.
+        Barcodes already indexed under another row stay with it and are
+        returned; the row is then left unindexed so `verify` reports them.
+        """
+        self.conn.execute("DELETE FROM barcodes WHERE row = ?", (row,))
+        conflicts = []
+        for barcode in barcodes:
+            if self.owner(barcode) is None:
+                self.conn.execute(
+                    "INSERT INTO barcodes (barcode, row, control_no) "
+                    "VALUES (?, ?, ?)",
+                    (barcode, row, control_no),
+                )
+            else:
+                conflicts.append(barcode)
+        if conflicts:
+            self.conn.execute("DELETE FROM rows WHERE row = ?", (row,))
+        else:
+            self.mark_indexed(row, cell)
+        return conflicts
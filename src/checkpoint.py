@@ -0,0 +1,262 @@
+"""
+Checkpoints of `create` runs allowing an interrupted run to be resumed.
+
+A checkpoint is saved after every batch of records flushed to the run's
+temporary output file and records how far the run got: the last sheet row
+written, the next control # sequence, the output file, the byte offset of
+the end of the last complete record in the temporary file and a digest of
+the content of the rows written. It also keeps the end of the control #s
+reserved by the run and the options a resumed run continues with.
+
+A run holds an exclusive lock on `out/create.lock` from before it looks for
+a checkpoint until it finishes, so overlapping runs cannot overwrite each
+other's batch or checkpoint.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from typing import TypedDict, cast
+
+from src.control_numbers import RESERVATION_SIZE, ControlNumberAllocator
+from src.reader import Item  # type: ignore
+
+
+CHECKPOINT_PATH = "out/checkpoint.json"
+RUN_LOCK_PATH = "out/create.lock"
+CHECKPOINT_KEYS = ("out", "tmp", "start", "row", "sequence", "offset")
+
+
+class RunOptions(TypedDict):
+    on_error: str
+    formats: str
+    changed_only: bool
+
+
+class Checkpoint(RunOptions):
+    out: str
+    tmp: str | None
+    start: int
+    row: int
+    sequence: int
+    offset: int
+    reserved: int
+    rows_digest: str | None
+
+
+def load_checkpoint(path: str = CHECKPOINT_PATH) -> Checkpoint | None:
+    """Returns saved checkpoint or None if there is no interrupted run"""
+    try:
+        with open(path, "r") as jsonfile:
+            checkpoint = json.load(jsonfile)
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        raise ValueError(f"Corrupted checkpoint {path}.")
+    if not isinstance(checkpoint, dict) or any(
+        key not in checkpoint for key in CHECKPOINT_KEYS
+    ):
+        raise ValueError(f"Corrupted checkpoint {path}.")
+    # checkpoints saved before these were kept
+    checkpoint.setdefault("reserved", checkpoint["sequence"])
+    checkpoint.setdefault("on_error", "abort")
+    checkpoint.setdefault("formats", "marc")
+    checkpoint.setdefault("changed_only", False)
+    checkpoint.setdefault("rows_digest", None)
+    return cast(Checkpoint, checkpoint)
+
+
+def save_checkpoint(checkpoint: Checkpoint, path: str = CHECKPOINT_PATH) -> None:
+    """Atomically replaces saved checkpoint"""
+    part = f"{path}.part"
+    with open(part, "w") as jsonfile:
+        json.dump(checkpoint, jsonfile)
+    os.replace(part, path)
+
+
+def clear_checkpoint(path: str = CHECKPOINT_PATH) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+@contextmanager
+def run_lock(path: str = RUN_LOCK_PATH) -> Iterator[None]:
+    """
+    Holds an exclusive lock for the duration of a run. Raises ValueError if
+    another run holds it. The lock is released when its process exits.
+    """
+    conn = sqlite3.connect(path, timeout=0, isolation_level=None)
+    try:
+        try:
+            conn.execute("BEGIN EXCLUSIVE")
+        except sqlite3.OperationalError:
+            raise ValueError("Another create run is in progress")
+        yield
+    finally:
+        conn.close()
+
+
+class RunProgress:
+    """
+    Progress of a `create` run as of the last row written to its batch.
+
+    It is saved as the run's checkpoint whenever the batch is flushed, along
+    with a digest of the rows written so far which a resumed run checks the
+    sheet against. Rows may be written by a background thread while the run
+    reserves more control #s, so saving is serialized.
+    """
+
+    def __init__(self, checkpoint: Checkpoint, path: str = CHECKPOINT_PATH) -> None:
+        self.checkpoint = checkpoint
+        self.path = path
+        self._digest = hashlib.sha256()
+        self._saved: Checkpoint | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def sequence(self) -> int:
+        """Next control # sequence"""
+        return self.checkpoint["sequence"]
+
+    def advance(self, row: int, item: Item, sequence: int) -> None:
+        """Records a sheet row written under control # `sequence`"""
+        self.checkpoint["row"] = row
+        self.checkpoint["sequence"] = sequence + 1
+        self._digest.update(f"{row}\x1f".encode("utf-8"))
+        self._digest.update("\x1f".join(item).encode("utf-8") + b"\x1e")
+
+    def save(self, offset: int) -> None:
+        """Saves progress as the checkpoint of a batch flushed up to `offset`"""
+        with self._lock:
+            self.checkpoint["offset"] = offset
+            self.checkpoint["rows_digest"] = self._digest.hexdigest()
+            self._saved = self.checkpoint.copy()
+            save_checkpoint(self._saved, self.path)
+
+    def reserve_through(self, sequence: int) -> None:
+        """Extends the run's reservation of control #s to hold `sequence`"""
+        end = self.checkpoint["reserved"]
+        if sequence < end:
+            return
+        with ControlNumberAllocator() as allocator:
+            end = allocator.extend(end, max(RESERVATION_SIZE, sequence + 1 - end))
+        with self._lock:
+            self.checkpoint["reserved"] = end
+            # an interrupted run gives back the whole reservation
+            if self._saved is not None:
+                self._saved["reserved"] = end
+                save_checkpoint(self._saved, self.path)
+
+    def replay(
+        self, rows: Iterable[tuple[int, Item]], saved: Checkpoint
+    ) -> list[tuple[int, Item, int]]:
+        """
+        Advances through leading `rows` written by a run before it was
+        interrupted at `saved` and returns them with their control #
+        sequences. Raises ValueError if they differ from the rows written.
+        """
+        written = []
+        for row, item in rows:
+            if row > saved["row"]:
+                break
+            written.append((row, item, self.sequence))
+            self.advance(row, item, self.sequence)
+        if self.sequence != saved["sequence"] or saved["rows_digest"] not in (
+            None,
+            self._digest.hexdigest(),
+        ):
+            raise ValueError(
+                "Rows marked for processing changed since the interrupted run, "
+                "drop it with `create --discard`"
+            )
+        return written
+
+    def interrupt(self) -> bool:
+        """
+        Handles failure of the run. Returns True if its checkpoint holds
+        written records to resume from, otherwise the run is discarded.
+        """
+        with self._lock:
+            saved = self._saved or load_checkpoint(self.path)
+        if saved is not None and saved["sequence"] > saved["start"]:
+            return True
+        discard_run(
+            Checkpoint(**{**self.checkpoint, "sequence": self.checkpoint["start"]}),
+            self.path,
+        )
+        return False
+
+    def finish(self) -> None:
+        """Clears the checkpoint and gives back control #s left unused"""
+        clear_checkpoint(self.path)
+        with ControlNumberAllocator() as allocator:
+            allocator.release(self.checkpoint["reserved"], self.sequence)
+
+
+def start_run(out: str, start_sequence: int | None, options: RunOptions) -> RunProgress:
+    """
+    Reserves control #s for a new run writing `out`, starting with
+    `start_sequence` or the next free one. Raises ValueError if there is an
+    interrupted run.
+    """
+    checkpoint = load_checkpoint()
+    if checkpoint is not None:
+        raise ValueError(
+            f"Found interrupted run of {checkpoint['out']}, continue it with "
+            "`create --resume` or drop it with `create --discard`"
+        )
+    # more control numbers are reserved as needed while the run goes on
+    with ControlNumberAllocator() as allocator:
+        start = allocator.reserve(RESERVATION_SIZE, start_sequence)
+    return RunProgress(
+        Checkpoint(
+            out=out,
+            tmp=None,
+            start=start,
+            row=0,
+            sequence=start,
+            offset=0,
+            reserved=start + RESERVATION_SIZE,
+            rows_digest=None,
+            **options,
+        )
+    )
+
+
+def resume_run() -> tuple[RunProgress, Checkpoint]:
+    """
+    Returns progress of the interrupted run from its start, to be replayed
+    over rows it wrote, along with its checkpoint. Raises ValueError if
+    there is no interrupted run or its output is missing.
+    """
+    checkpoint = load_checkpoint()
+    if checkpoint is None:
+        raise ValueError("No interrupted run to resume")
+    if checkpoint["tmp"] is None or not os.path.exists(checkpoint["tmp"]):
+        raise ValueError(
+            f"Output of the interrupted run {checkpoint['tmp']} is missing, "
+            "drop it with `create --discard`"
+        )
+    progress = RunProgress(
+        Checkpoint(**{**checkpoint, "row": 0, "sequence": checkpoint["start"]})
+    )
+    return progress, checkpoint
+
+
+def discard_run(checkpoint: Checkpoint, path: str = CHECKPOINT_PATH) -> None:
+    """
+    Drops an interrupted run, removing its output and checkpoint and giving
+    back control #s it reserved past the last record it wrote
+    """
+    tmp = checkpoint["tmp"]
+    if tmp is not None and os.path.exists(tmp):
+        os.remove(tmp)
+    with ControlNumberAllocator() as allocator:
+        allocator.release(checkpoint["reserved"], checkpoint["sequence"])
+    clear_checkpoint(path)
@@ -0,0 +1,170 @@
+"""
+Allocation of control numbers (001) kept in a SQLite database under `out/`.
+
+Runs reserve blocks of sequence numbers in a single write transaction, so
+concurrent or repeated runs never receive the same numbers. The next free
+number is never lower than the highest one found in 001 fields of existing
+MARC21 files; each file is scanned with `src.marc_scan` once and rescanned
+only when its size or modification time changes.
+"""
+
+import glob
+import os
+import sqlite3
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+
+from src.history import HISTORY_PATTERN
+from src.marc_scan import control_field, iter_records
+
+
+SEQUENCE_PATH = "out/sequence.db"
+# control numbers reserved at once
+RESERVATION_SIZE = 100
+CONTROL_NO_PREFIX = "bkl-tll-"
+
+
+def control_no_sequence(control_no: str | None) -> int:
+    """Returns sequence of a control number, 0 for foreign or missing ones"""
+    if control_no and control_no.startswith(CONTROL_NO_PREFIX):
+        sequence = control_no[len(CONTROL_NO_PREFIX) :]
+        if sequence.isdigit():
+            return int(sequence)
+    return 0
+
+
+def highest_sequence(file: str) -> int:
+    """Returns highest control number sequence found in a MARC21 file"""
+    highest = 0
+    with open(file, "rb") as fh:
+        for _, record in iter_records(fh):
+            highest = max(highest, control_no_sequence(control_field(record, "001")))
+    return highest
+
+
+class ControlNumberAllocator:
+    def __init__(self, path: str = SEQUENCE_PATH) -> None:
+        self.path = path
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS state (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                next INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS files (
+                file TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime INTEGER NOT NULL,
+                highest INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO state (id, next) VALUES (1, 1);
+            """
+        )
+
+    def __enter__(self) -> "ControlNumberAllocator":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.conn.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        # takes the write lock up front, other allocators wait for it
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def refresh(self, files: Iterable[str] | None = None) -> int:
+        """
+        Brings highest control numbers of given MARC21 files up to date, by
+        default of all batches in `out/`. Numbers of files no longer present
+        stay in use. Returns number of files (re)scanned.
+        """
+        if files is None:
+            files = glob.glob(HISTORY_PATTERN)
+        known = {
+            file: (size, mtime)
+            for file, size, mtime in self.conn.execute(
+                "SELECT file, size, mtime FROM files"
+            )
+        }
+        scanned = []
+        for file in files:
+            stat = os.stat(file)
+            if known.get(file) != (stat.st_size, stat.st_mtime_ns):
+                scanned.append(
+                    (file, stat.st_size, stat.st_mtime_ns, highest_sequence(file))
+                )
+        with self._transaction():
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO files (file, size, mtime, highest) "
+                "VALUES (?, ?, ?, ?)",
+                scanned,
+            )
+        return len(scanned)
+
+    def _next(self) -> int:
+        (next_sequence,) = self.conn.execute(
+            "SELECT MAX(next, IFNULL((SELECT MAX(highest) FROM files), 0) + 1) "
+            "FROM state"
+        ).fetchone()
+        return next_sequence
+
+    def next_sequence(self) -> int:
+        """Returns next free control number sequence"""
+        self.refresh()
+        return self._next()
+
+    def reserve(self, count: int, start: int | None = None) -> int:
+        """
+        Reserves `count` sequence numbers starting with the next free one or
+        `start` if given and returns the first. Raises ValueError if `start`
+        is already used or reserved, or if it is not given while no numbers
+        were used or reserved yet.
+        """
+        self.refresh()
+        with self._transaction():
+            next_sequence = self._next()
+            if start is None:
+                if next_sequence == 1:
+                    raise ValueError(
+                        "No control #s were used yet, give the starting "
+                        "sequence explicitly"
+                    )
+                start = next_sequence
+            elif start < next_sequence:
+                raise ValueError(
+                    f"Control # sequence {start} is already used or reserved, "
+                    f"next free one is {next_sequence}"
+                )
+            self.conn.execute("UPDATE state SET next = ?", (start + count,))
+        return start
+
+    def extend(self, end: int, count: int) -> int:
+        """
+        Extends a reservation ending before `end` by `count` numbers and
+        returns its new end. Raises ValueError if numbers following the
+        reservation were taken by another run meanwhile.
+        """
+        with self._transaction():
+            if self._next() != end:
+                raise ValueError(
+                    f"Control # sequence {end} was reserved by another run"
+                )
+            self.conn.execute("UPDATE state SET next = ?", (end + count,))
+        return end + count
+
+    def release(self, end: int, used_end: int) -> None:
+        """
+        Returns unused numbers from `used_end` to `end` of a reservation,
+        unless numbers following it were reserved meanwhile.
+        """
+        with self._transaction():
+            self.conn.execute(
+                "UPDATE state SET next = ? WHERE next = ?", (used_end, end)
+            )
@@ -1,20 +1,159 @@
-from src.producer import _barcodes2list
-from src.reader import read_data
+import csv
+import os
 
+from src.barcode_index import INDEX_PATH, BarcodeIndex
+from src.history import HISTORY_PATH, HistoryIndex
+from src.producer import (
+    _barcodes2list,
+    _is_valid_barcode,
+    _is_valid_cost,
+    _is_valid_loan_restriction,
+    _is_valid_title,
+    _is_valid_url,
+    _subjects2list,
+    _values2list,
+)
+from src.downloader import COL_NAMES
+from src.reader import Item, read_data  # type: ignore
 
-def verify_barcodes():
-    unique_barcodes = set()
+
+VALIDATED_FIELDS = ("t245", "t690", "t856", "barcode", "cost", "loan_restriction")
+
+
+def _verify_history(items: list, history_path: str) -> bool:
+    """
+    Reports barcodes of new rows found in previously created MARC21 files.
+    Returns True if any were found.
+    """
     dups = False
+    with HistoryIndex(history_path) as history:
+        history.refresh()
+        for item in items:
+            for barcode in _barcodes2list(item.barcode):
+                for file in history.find(barcode):
+                    print(
+                        f"Found previously loaded barcode: {barcode} for "
+                        f"{item.t245} in {file}"
+                    )
+                    dups = True
+    return dups
+
+
+def verify_barcodes(
+    index_path: str = INDEX_PATH,
+    against_history: bool = False,
+    history_path: str = HISTORY_PATH,
+) -> None:
+    """
+    Reports barcodes used more than once in the sheet or already used by
+    crosswalked bibs. Only rows added or changed since the last run are
+    checked; barcodes of the others are kept in a persistent index.
+
+    With `against_history` barcodes of rows marked for processing are also
+    checked against items of all MARC21 files in `out/`.
+    """
+    dups = False
+    new_items = []
+
+    with BarcodeIndex(index_path) as index:
+        indexed = index.indexed_rows()
+        changed = []
+        last_row = 1
+        for last_row, item in read_data(
+            fields=("status", "t245", "barcode"), numbered=True
+        ):
+            if indexed.get(last_row) != item.barcode:
+                changed.append((last_row, item))
+            if against_history and item.status == "for processing":
+                new_items.append(item)
+
+        index.remove_rows_after(last_row)
+        index.remove_rows(row for row, _ in changed)
 
-    data = read_data()
-    for item in data:
-        barcodes_lst = _barcodes2list(item.barcode)
-        for barcode in barcodes_lst:
-            if barcode in unique_barcodes:
-                print(f"Found duplicate barcode: {barcode} for {item.t245}")
-                dups = True
-            else:
-                unique_barcodes.add(barcode)
+        for row, item in changed:
+            barcodes_lst = _barcodes2list(item.barcode)
+            unique_barcodes: list[str] = []
+            for barcode in barcodes_lst:
+                if barcode in unique_barcodes or index.owner(barcode) is not None:
+                    print(f"Found duplicate barcode: {barcode} for {item.t245}")
+                    dups = True
+                else:
+                    unique_barcodes.append(barcode)
+            index.add_barcodes(row, unique_barcodes)
+            if len(unique_barcodes) == len(barcodes_lst):
+                index.mark_indexed(row, item.barcode)
+
+    if against_history and _verify_history(new_items, history_path):
+        dups = True
 
     if not dups:
         print("Success! No duplicate barcodes found.")
+
+
+def validate_item(item: Item) -> list[str]:
+    """
+    Returns problems of a row that would make `generate_bib` fail.
+    Runs the predicates of the field builders without creating records.
+    """
+    errors = []
+    if not _is_valid_title(item.t245):
+        errors.append("Missing title.")
+    if not _subjects2list(item.t690):
+        errors.append("No subjects tags were provided.")
+    for url in _values2list(item.t856):
+        if not _is_valid_url(url):
+            errors.append(f"Invalid manual URL: {url}")
+
+    barcodes_lst = _values2list(item.barcode)
+    if not barcodes_lst:
+        errors.append("Missing barcode(s).")
+    for barcode in barcodes_lst:
+        if not _is_valid_barcode(barcode):
+            errors.append(f"Invalid barcode: {barcode}")
+    if not _is_valid_cost(item.cost):
+        errors.append(f"Invalid cost: {item.cost!r}")
+    return errors
+
+
+def validate_rows() -> int:
+    """
+    Reports problems of all rows marked for processing in a single pass.
+    Returns number of invalid rows.
+    """
+    invalid = 0
+    checked = 0
+    for row, item in read_data(
+        status="for processing", fields=VALIDATED_FIELDS, numbered=True
+    ):
+        checked += 1
+        errors = validate_item(item)
+        if errors:
+            invalid += 1
+            for error in errors:
+                print(f"Row {row} ({item.t245.strip()}): {error}")
+        if not _is_valid_loan_restriction(item.loan_restriction):
+            print(
+                f"Row {row} ({item.t245.strip()}): Warning, invalid loan "
+                f"restriction value {item.loan_restriction!r}, item will not be "
+                "restricted."
+            )
+
+    if invalid:
+        print(f"Found errors in {invalid} of {checked} rows marked for processing.")
+    else:
+        print(f"Success! All {checked} rows marked for processing are valid.")
+    return invalid
+
+
+def save_rejects(rejects: list[tuple[int, Item, list[str]]], fh_out: str) -> None:
+    """
+    Appends rows quarantined by `create --on-error=quarantine` along with
+    their problems to a CSV file.
+    """
+    new_file = not os.path.exists(fh_out)
+    with open(fh_out, "a", newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        if new_file:
+            writer.writerow(["row", "errors", *COL_NAMES])
+        for row, item, errors in rejects:
+            writer.writerow([row, " ".join(errors), *item])
@@ -1,11 +1,18 @@
-# type: ignore
-
-import pandas as pd
+import csv
+import hashlib
+import io
+import json
+import os
+import time
+from collections.abc import Callable
 
 
 SHEET_ID = "17LM0oVr7ByrbgTzXMPTQRgQPhuoJvI4T84_S3gOEAqc"
 SHEET_NAME = "metadata"
-URL = f"https://docs.google.com/spreadsheets/d/{SHEET_ID}/gviz/tq?tqx=out:csv&sheet={SHEET_NAME}"
+URL = (
+    f"https://docs.google.com/spreadsheets/d/{SHEET_ID}/gviz/tq?"
+    f"tqx=out:csv&sheet={SHEET_NAME}"
+)
 COL_NAMES = [
     "status",
     "t245",
@@ -22,6 +29,132 @@ COL_NAMES = [
 ]
 
 
-def get_metadata():
-    df = pd.read_csv(URL, usecols=range(1, 13), names=COL_NAMES, skiprows=[0])
-    df.to_csv("out/metadata.csv", index=False)
+def _select_columns(row: list[str]) -> list[str]:
+    """Picks sheet's columns 1-12, padding short rows with empty values"""
+    values = row[1 : len(COL_NAMES) + 1]
+    if len(values) < len(COL_NAMES):
+        values.extend([""] * (len(COL_NAMES) - len(values)))
+    return values
+
+
+def _cache_path(fh_out: str) -> str:
+    return f"{os.path.splitext(fh_out)[0]}.json"
+
+
+def _load_cache(fh_out: str, url: str) -> dict:
+    """Returns cached download details of `fh_out` if they are still usable"""
+    if not os.path.exists(fh_out):
+        return {}
+    try:
+        with open(_cache_path(fh_out), "r") as jsonfile:
+            cache = json.load(jsonfile)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(cache, dict) or cache.get("url") != url:
+        return {}
+    return cache
+
+
+def _save_cache(fh_out: str, cache: dict) -> None:
+    with open(_cache_path(fh_out), "w") as jsonfile:
+        json.dump(cache, jsonfile, indent=2)
+
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_metadata(
+    response, fh_out: str, on_row: Callable[[list[str]], None] | None = None
+) -> None:
+    encoding = response.headers.get_content_charset("utf-8")
+    reader = csv.reader(io.TextIOWrapper(response, encoding=encoding, newline=""))
+    next(reader, None)  # skip the sheet's header
+    with open(fh_out, "w", newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(COL_NAMES)
+        for row in reader:
+            if row:
+                values = _select_columns(row)
+                writer.writerow(values)
+                if on_row is not None:
+                    on_row(values)
+
+
+def get_metadata(
+    url: str = URL,
+    fh_out: str = "out/metadata.csv",
+    max_age: float | None = None,
+    offline: bool = False,
+    on_row: Callable[[list[str]], None] | None = None,
+) -> bool:
+    """
+    Refreshes local copy of the sheet in `fh_out` keeping only the crosswalked
+    columns. Rows are streamed as they arrive so the whole sheet is never held
+    in memory; each downloaded row is also passed to `on_row`, which is not
+    called when the local copy is kept without downloading.
+
+    ETag, Last-Modified and a content hash of the last download are kept next
+    to `fh_out` and used to send a conditional request; the local copy is left
+    untouched when the server answers 304 or the content did not change.
+    A copy fetched less than `max_age` seconds ago is used without contacting
+    the server and `offline` never contacts it.
+
+    Returns True if `fh_out` was rewritten.
+    """
+    cache = _load_cache(fh_out, url)
+    if offline:
+        if not os.path.exists(fh_out):
+            raise FileNotFoundError(f"No local copy of metadata in {fh_out}")
+        return False
+    if cache and max_age is not None and time.time() - cache["fetched"] < max_age:
+        return False
+
+    # urllib pulls in http, email and ssl modules, import it only to download
+    from urllib.error import HTTPError
+    from urllib.request import Request, urlopen
+
+    request = Request(url)
+    if cache.get("etag"):
+        request.add_header("If-None-Match", cache["etag"])
+    if cache.get("last_modified"):
+        request.add_header("If-Modified-Since", cache["last_modified"])
+
+    try:
+        response = urlopen(request)
+    except HTTPError as exc:
+        if exc.code != 304:
+            raise
+        cache["fetched"] = time.time()
+        _save_cache(fh_out, cache)
+        return False
+
+    tmp_path = f"{fh_out}.part"
+    try:
+        with response:
+            _write_metadata(response, tmp_path, on_row)
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+        content_hash = _file_hash(tmp_path)
+        updated = content_hash != cache.get("sha256")
+        if updated:
+            os.replace(tmp_path, fh_out)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    _save_cache(
+        fh_out,
+        {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "sha256": content_hash,
+            "fetched": time.time(),
+        },
+    )
+    return updated
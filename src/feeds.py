@@ -0,0 +1,187 @@
+"""
+Streaming MARCXML and MARC-in-JSON writers producing feeds of created bibs
+for discovery layers next to the MARC21 batch.
+
+Records are transcoded straight from their MARC21 serialization, reading
+fields with `src.marc_scan`, so no pymarc record is built for a feed. Like
+`MarcBatchWriter` the writers keep a single file handle open for a whole run
+and write into a temporary file which replaces the output only when the run
+succeeds; records already present in the output are kept. Records are
+written one at a time so memory does not grow with the batch.
+"""
+
+import json
+import os
+import shutil
+from abc import ABC, abstractmethod
+from io import BufferedReader, BufferedWriter
+from typing import BinaryIO
+from xml.sax.saxutils import escape, quoteattr
+
+from pymarc import Record  # type: ignore
+
+from src.marc_scan import SUBFIELD_INDICATOR, iter_fields
+from src.output import open_temporary, sync
+
+
+XML_HEADER = b'<?xml version="1.0" encoding="UTF-8"?>'
+XML_HEADER += b'<collection xmlns="http://www.loc.gov/MARC21/slim">'
+XML_FOOTER = b"</collection>"
+
+
+def _is_control_field(tag: str) -> bool:
+    return tag < "010" and tag.isdigit()
+
+
+def _subfields(data: bytes) -> list[tuple[str, str]]:
+    """Returns (code, value) pairs of a data field"""
+    return [
+        (chunk[:1].decode("utf-8"), chunk[1:].decode("utf-8"))
+        for chunk in data.split(SUBFIELD_INDICATOR)[1:]
+    ]
+
+
+def marc_to_xml(record: bytes) -> str:
+    """Returns MARCXML record element of a MARC21 record"""
+    parts = [f"<record><leader>{escape(record[:24].decode('utf-8'))}</leader>"]
+    for tag, data in iter_fields(record):
+        if _is_control_field(tag):
+            parts.append(
+                f'<controlfield tag="{tag}">{escape(data.decode("utf-8"))}'
+                "</controlfield>"
+            )
+            continue
+        indicators = data[:2].decode("utf-8")
+        parts.append(
+            f"<datafield ind1={quoteattr(indicators[0])} "
+            f'ind2={quoteattr(indicators[1])} tag="{tag}">'
+        )
+        for code, value in _subfields(data):
+            parts.append(f"<subfield code={quoteattr(code)}>{escape(value)}</subfield>")
+        parts.append("</datafield>")
+    parts.append("</record>")
+    return "".join(parts)
+
+
+def marc_to_dict(record: bytes) -> dict:
+    """Returns MARC-in-JSON object of a MARC21 record"""
+    fields: list[dict] = []
+    for tag, data in iter_fields(record):
+        if _is_control_field(tag):
+            fields.append({tag: data.decode("utf-8")})
+            continue
+        indicators = data[:2].decode("utf-8")
+        fields.append(
+            {
+                tag: {
+                    "ind1": indicators[0],
+                    "ind2": indicators[1],
+                    "subfields": [{code: value} for code, value in _subfields(data)],
+                }
+            }
+        )
+    return {"leader": record[:24].decode("utf-8"), "fields": fields}
+
+
+class _FeedWriter(ABC):
+    def __init__(self, fh_out: str) -> None:
+        self.fh_out = fh_out
+        self.records_written = 0
+        self._out: BinaryIO | None = None
+        self._tmp_path: str | None = None
+
+    def __enter__(self):
+        self._out, self._tmp_path = open_temporary(self.fh_out, copy=self._copy)
+        try:
+            self._open(self._out)
+        except BaseException:
+            self._out.close()
+            os.remove(self._tmp_path)
+            raise
+        return self
+
+    def _opened(self) -> tuple[BinaryIO, str]:
+        """Returns the temporary file and its path, set within the with block"""
+        if self._out is None or self._tmp_path is None:
+            raise ValueError(
+                f"{type(self).__name__} is used outside of its with block."
+            )
+        return self._out, self._tmp_path
+
+    def _copy(self, existing: BufferedReader, out: BufferedWriter) -> None:
+        """Carries records of an existing feed over to the new one"""
+        shutil.copyfileobj(existing, out)
+
+    def _open(self, out: BinaryIO) -> None:
+        pass
+
+    @abstractmethod
+    def _write(self, out: BinaryIO, record: bytes) -> None:
+        """Writes a MARC21 record in the format of the feed"""
+
+    def _close(self, out: BinaryIO) -> None:
+        pass
+
+    def write(self, bib: Record | bytes) -> None:
+        """Writes a record given as pymarc record or MARC21 serialization"""
+        if isinstance(bib, Record):
+            bib = bib.as_marc()
+        out, _ = self._opened()
+        self._write(out, bib)
+        self.records_written += 1
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        out, tmp_path = self._opened()
+        completed = False
+        try:
+            if exc_type is None:
+                self._close(out)
+                sync(out)
+                completed = True
+        finally:
+            out.close()
+            self._out = None
+            if completed and (self.records_written or os.path.exists(self.fh_out)):
+                os.replace(tmp_path, self.fh_out)
+            else:
+                os.remove(tmp_path)
+
+
+class MarcXmlWriter(_FeedWriter):
+    """Writes records as a single MARCXML collection"""
+
+    def _copy(self, existing: BufferedReader, out: BufferedWriter) -> None:
+        # copy records between the collection's opening and closing tags
+        size = os.fstat(existing.fileno()).st_size
+        if existing.read(len(XML_HEADER)) != XML_HEADER:
+            raise ValueError(f"{self.fh_out} is not a MARCXML collection.")
+        existing.seek(size - len(XML_FOOTER))
+        if existing.read() != XML_FOOTER:
+            raise ValueError(f"{self.fh_out} is not a MARCXML collection.")
+        existing.seek(len(XML_HEADER))
+        out.write(XML_HEADER)
+        remaining = size - len(XML_HEADER) - len(XML_FOOTER)
+        while remaining > 0:
+            chunk = existing.read(min(remaining, 1 << 20))
+            out.write(chunk)
+            remaining -= len(chunk)
+
+    def _open(self, out: BinaryIO) -> None:
+        if not out.tell():
+            out.write(XML_HEADER)
+
+    def _write(self, out: BinaryIO, record: bytes) -> None:
+        out.write(marc_to_xml(record).encode("utf-8"))
+
+    def _close(self, out: BinaryIO) -> None:
+        out.write(XML_FOOTER)
+
+
+class MarcJsonWriter(_FeedWriter):
+    """Writes records as MARC-in-JSON objects, one per line"""
+
+    def _write(self, out: BinaryIO, record: bytes) -> None:
+        line = json.dumps(
+            marc_to_dict(record), ensure_ascii=False, separators=(",", ":")
+        )
+        out.write(line.encode("utf-8") + b"\n")
@@ -0,0 +1,73 @@
+"""
+Content fingerprints of crosswalked rows kept in a SQLite database under
+`out/`.
+
+A row is identified by its first barcode and stored with a hash of all its
+values and the control number of its bib, which allows `create` to skip rows
+emitted unchanged before and to re-emit edited ones under the same control
+number.
+"""
+
+import hashlib
+import sqlite3
+
+from src.producer import _values2list
+from src.reader import Item  # type: ignore
+
+
+FINGERPRINTS_PATH = "out/fingerprints.db"
+
+
+def row_key(item: Item) -> str | None:
+    """Returns first barcode of a row, None if it has none"""
+    barcodes = _values2list(item.barcode)
+    return barcodes[0] if barcodes else None
+
+
+def fingerprint(item: Item) -> str:
+    """Returns hash of all values of a row"""
+    return hashlib.sha256("\x1f".join(item).encode("utf-8")).hexdigest()
+
+
+class RowFingerprints:
+    def __init__(self, path: str = FINGERPRINTS_PATH) -> None:
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS rows (
+                key TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                control_no TEXT NOT NULL
+            )
+            """
+        )
+
+    def __enter__(self) -> "RowFingerprints":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.conn.commit()
+        else:
+            self.conn.rollback()
+        self.conn.close()
+
+    def emitted(self) -> dict[str, tuple[str, str]]:
+        """Returns (fingerprint, control number) of each emitted row"""
+        return {
+            key: (fp, control_no)
+            for key, fp, control_no in self.conn.execute(
+                "SELECT key, fingerprint, control_no FROM rows"
+            )
+        }
+
+    def record(self, item: Item, control_no: str) -> None:
+        """Stores fingerprint of a row emitted under given control number"""
+        key = row_key(item)
+        if key is not None:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO rows (key, fingerprint, control_no) "
+                "VALUES (?, ?, ?)",
+                (key, fingerprint(item), control_no),
+            )
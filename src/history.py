@@ -0,0 +1,158 @@
+"""
+Cached index of records and barcodes of previously produced MARC21 files.
+
+Files are scanned once with `src.marc_scan` and rescanned only when their
+size or modification time changes. The index is a SQLite database under
+`out/` holding the control number, barcodes and location (file, offset and
+length) of each record, so a record can be read without parsing its file.
+"""
+
+import glob
+import os
+import sqlite3
+from collections.abc import Iterable
+
+from src.marc_scan import control_field, item_barcodes, iter_records
+
+
+HISTORY_PATH = "out/history.db"
+HISTORY_PATTERN = "out/tool-bibs-*.mrc"
+# bumped on schema changes, an index of an older version is rebuilt
+SCHEMA_VERSION = 1
+
+
+class HistoryIndex:
+    def __init__(self, path: str = HISTORY_PATH) -> None:
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        (version,) = self.conn.execute("PRAGMA user_version").fetchone()
+        if version != SCHEMA_VERSION:
+            self.conn.executescript(
+                f"""
+                DROP TABLE IF EXISTS files;
+                DROP TABLE IF EXISTS records;
+                DROP TABLE IF EXISTS barcodes;
+                PRAGMA user_version = {SCHEMA_VERSION};
+                """
+            )
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                file TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS records (
+                control_no TEXT,
+                file TEXT NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS barcodes (
+                barcode TEXT NOT NULL,
+                file TEXT NOT NULL,
+                offset INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS records_control_no ON records (control_no);
+            CREATE INDEX IF NOT EXISTS records_file ON records (file);
+            CREATE INDEX IF NOT EXISTS barcodes_barcode ON barcodes (barcode);
+            CREATE INDEX IF NOT EXISTS barcodes_file ON barcodes (file);
+            """
+        )
+
+    def __enter__(self) -> "HistoryIndex":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.conn.commit()
+        else:
+            self.conn.rollback()
+        self.conn.close()
+
+    def _forget(self, file: str) -> None:
+        self.conn.execute("DELETE FROM files WHERE file = ?", (file,))
+        self.conn.execute("DELETE FROM records WHERE file = ?", (file,))
+        self.conn.execute("DELETE FROM barcodes WHERE file = ?", (file,))
+
+    def _scan(self, file: str) -> None:
+        with open(file, "rb") as fh:
+            for offset, record in iter_records(fh):
+                self.conn.execute(
+                    "INSERT INTO records (control_no, file, offset, length) "
+                    "VALUES (?, ?, ?, ?)",
+                    (control_field(record, "001"), file, offset, len(record)),
+                )
+                self.conn.executemany(
+                    "INSERT INTO barcodes (barcode, file, offset) VALUES (?, ?, ?)",
+                    [(barcode, file, offset) for barcode in item_barcodes(record)],
+                )
+
+    def refresh(self, files: Iterable[str] | None = None) -> int:
+        """
+        Brings index up to date with given MARC21 files, by default all
+        batches in `out/`. Returns number of files (re)scanned.
+        """
+        if files is None:
+            files = glob.glob(HISTORY_PATTERN)
+        known = {
+            file: (size, mtime)
+            for file, size, mtime in self.conn.execute(
+                "SELECT file, size, mtime FROM files"
+            )
+        }
+        scanned = 0
+        present = set()
+        for file in files:
+            present.add(file)
+            stat = os.stat(file)
+            if known.get(file) == (stat.st_size, stat.st_mtime_ns):
+                continue
+            self._forget(file)
+            self._scan(file)
+            self.conn.execute(
+                "INSERT INTO files (file, size, mtime) VALUES (?, ?, ?)",
+                (file, stat.st_size, stat.st_mtime_ns),
+            )
+            scanned += 1
+        for file in known.keys() - present:
+            self._forget(file)
+        return scanned
+
+    def find(self, barcode: str) -> list[str]:
+        """Returns files holding items with given barcode"""
+        return [
+            file
+            for (file,) in self.conn.execute(
+                "SELECT DISTINCT file FROM barcodes WHERE barcode = ? ORDER BY file",
+                (barcode,),
+            )
+        ]
+
+    def locate(
+        self, control_no: str | None = None, barcode: str | None = None
+    ) -> list[tuple[str, int, int]]:
+        """
+        Returns (file, offset, length) of records with given control number
+        or holding an item with given barcode
+        """
+        if control_no is not None:
+            query = (
+                "SELECT file, offset, length FROM records WHERE control_no = ? "
+                "ORDER BY file, offset"
+            )
+            key: str | None = control_no
+        else:
+            query = (
+                "SELECT DISTINCT r.file, r.offset, r.length FROM barcodes b "
+                "JOIN records r ON r.file = b.file AND r.offset = b.offset "
+                "WHERE b.barcode = ? ORDER BY r.file, r.offset"
+            )
+            key = barcode
+        return list(self.conn.execute(query, (key,)))
+
+    def counts(self) -> tuple[int, int]:
+        """Returns numbers of indexed files and records"""
+        return self.conn.execute(
+            "SELECT (SELECT COUNT(*) FROM files), (SELECT COUNT(*) FROM records)"
+        ).fetchone()
@@ -0,0 +1,95 @@
+"""
+Low level reading of MARC21 (ISO 2709) files.
+
+Records are located using the record length stored in their leader and
+only the directory entries of requested tags are decoded, which is much
+cheaper than parsing whole records with pymarc.
+"""
+
+import mmap
+from collections.abc import Iterable, Iterator
+from typing import BinaryIO
+
+
+LEADER_LEN = 24
+DIRECTORY_ENTRY_LEN = 12
+END_OF_FIELD = b"\x1e"
+SUBFIELD_INDICATOR = b"\x1f"
+
+
+def iter_records(fh: BinaryIO) -> Iterator[tuple[int, bytes]]:
+    """
+    Yields (offset, record) pairs of a MARC21 file opened in binary mode.
+    A truncated record at the end of the file raises ValueError.
+    """
+    offset = 0
+    while True:
+        head = fh.read(5)
+        if not head:
+            return
+        try:
+            length = int(head)
+        except ValueError:
+            raise ValueError(f"Invalid record length at offset {offset}.")
+        record = head + fh.read(length - 5)
+        if len(record) != length or length < LEADER_LEN:
+            raise ValueError(f"Truncated record at offset {offset}.")
+        yield offset, record
+        offset += length
+
+
+def read_record(path: str, offset: int, length: int) -> bytes:
+    """
+    Returns record of given length at an offset of a MARC21 file, mapping
+    the file into memory instead of reading it. Raises ValueError if no
+    record of that length starts there.
+    """
+    with open(path, "rb") as fh:
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            record = mm[offset : offset + length]
+    if len(record) != length or record[:5] != b"%05d" % length:
+        raise ValueError(f"No record of length {length} at offset {offset}.")
+    return record
+
+
+def iter_fields(
+    record: bytes, tags: Iterable[str] | None = None
+) -> Iterator[tuple[str, bytes]]:
+    """
+    Yields (tag, data) pairs of fields of a record found in its directory,
+    optionally limited to given tags. Data excludes the field terminator.
+    """
+    wanted = None if tags is None else {t.encode("ascii") for t in tags}
+    base_address = int(record[12:17])
+    for pos in range(LEADER_LEN, base_address - 1, DIRECTORY_ENTRY_LEN):
+        tag = record[pos : pos + 3]
+        if wanted is not None and tag not in wanted:
+            continue
+        length = int(record[pos + 3 : pos + 7])
+        start = base_address + int(record[pos + 7 : pos + 12])
+        yield tag.decode("ascii"), record[start : start + length - 1]
+
+
+def control_field(record: bytes, tag: str) -> str | None:
+    """Returns value of the first occurrence of a control field"""
+    for _, data in iter_fields(record, (tag,)):
+        return data.decode("utf-8")
+    return None
+
+
+def subfield_values(data: bytes, code: str) -> list[str]:
+    """Returns values of subfield `code` of a data field"""
+    code_bytes = code.encode("ascii")
+    return [
+        chunk[1:].decode("utf-8")
+        for chunk in data.split(SUBFIELD_INDICATOR)[1:]
+        if chunk[:1] == code_bytes
+    ]
+
+
+def item_barcodes(record: bytes) -> list[str]:
+    """Returns barcodes ($i) of item fields (960) of a record"""
+    barcodes = []
+    for _, data in iter_fields(record, ("960",)):
+        barcodes.extend(subfield_values(data, "i"))
+    return barcodes
@@ -0,0 +1,184 @@
+"""
+Direct ISO 2709 serialization of tool bibs.
+
+Produces the same bytes as `generate_bib(...).as_marc()` without building
+pymarc objects. Constant fields are encoded once when the serializer is created
+and each record is assembled in reusable buffers.
+"""
+
+from datetime import datetime
+
+from src.producer import (
+    BibTemplate,
+    _barcodes2list,
+    _control_no,
+    _enforce_no_trailing_punctuation,
+    _enforce_trailing_period,
+    _is_valid_title,
+    _is_valid_url,
+    _subjects2list,
+    _values2list,
+)
+from src.reader import Item  # type: ignore
+
+
+LEADER_LEN = 24
+END_OF_FIELD = "\x1e"
+END_OF_RECORD = b"\x1d"
+SUBFIELD_INDICATOR = "\x1f"
+
+
+def _directory_prefix(tag: str, field_data: bytes) -> bytes:
+    return f"{tag}{len(field_data):04}".encode("utf-8")
+
+
+class MarcSerializer:
+    """
+    Serializes sheet rows straight to MARC21 following `generate_bib` layout.
+
+    Validation and normalization rules are the same as in `src.producer`
+    and so are the errors raised for invalid rows.
+    """
+
+    def __init__(self, template: BibTemplate | None = None) -> None:
+        if template is None:
+            template = BibTemplate()
+        self._template = template
+        leader = template.leader
+        self._leader_head = leader[5:12].encode("utf-8")
+        self._leader_tail = leader[17:].encode("utf-8")
+
+        # constant fields as (directory prefix, field data) pairs
+        self._t003 = self._encode(template.t003)
+        self._t008 = self._encode(template.t008)
+        self._t099 = self._encode(template.t099)
+        self._t300 = self._encode(template.t300)
+        self._t33x = [self._encode(f) for f in template.t33x]
+        self._t856 = self._encode(template.t856)
+        self._t949 = self._encode(template.t949)
+
+        self._directory = bytearray()
+        self._data = bytearray()
+
+    @staticmethod
+    def _encode(field) -> tuple[bytes, bytes]:
+        field_data = field.as_marc(encoding="utf-8")
+        return _directory_prefix(field.tag, field_data), field_data
+
+    def _add_constant(self, field: tuple[bytes, bytes]) -> None:
+        prefix, field_data = field
+        self._directory += prefix
+        self._directory += b"%05d" % len(self._data)
+        self._data += field_data
+
+    def _add(self, tag: str, value: str) -> None:
+        field_data = f"{value}{END_OF_FIELD}".encode("utf-8")
+        self._directory += b"%s%04d%05d" % (
+            tag.encode("utf-8"),
+            len(field_data),
+            len(self._data),
+        )
+        self._data += field_data
+
+    def serialize(
+        self, item: Item, control_no_sequence: int, timestamp: str | None = None
+    ) -> bytes:
+        """
+        Returns MARC21 record of the item. `timestamp` is used as the 005
+        value, by default the current time.
+        """
+        if timestamp is None:
+            timestamp = datetime.strftime(datetime.now(), "%y%m%d%H%M%S.%f")
+
+        self._directory.clear()
+        self._data.clear()
+        add = self._add
+        sf = SUBFIELD_INDICATOR
+
+        # 001, 003, 005, 008
+        add("001", _control_no(control_no_sequence))
+        self._add_constant(self._t003)
+        add("005", timestamp)
+        self._add_constant(self._t008)
+
+        # 028
+        for i in _values2list(item.t028):
+            add("028", f"50{sf}a{i}")
+
+        # 099
+        self._add_constant(self._t099)
+
+        # 245
+        if not _is_valid_title(item.t245):
+            raise ValueError
+        add("245", f"00{sf}a{item.t245.strip()}")
+
+        # 246
+        for t in _values2list(item.t246):
+            add("246", f"13{sf}a{t}")
+
+        # 300 & RDA 3xx tags
+        self._add_constant(self._t300)
+        for field in self._t33x:
+            self._add_constant(field)
+
+        # 500
+        for n in _values2list(item.t500):
+            n = _enforce_no_trailing_punctuation(n)
+            add("500", f"  {sf}a{n.capitalize()}")
+
+        # 505
+        if item.t505.strip():
+            value = _enforce_no_trailing_punctuation(item.t505)
+            add("505", f"8 {sf}a{value.capitalize()}")
+
+        # 520
+        value = _enforce_trailing_period(item.t520)
+        if value:
+            add("520", f"  {sf}a{value.capitalize()}")
+
+        # 690
+        subjects = _subjects2list(item.t690)
+        if not subjects:
+            raise Warning("No subjects tags were provided.")
+        for s in subjects:
+            add("690", f" 4{sf}a{s}.")
+
+        # 856s
+        for u in _values2list(item.t856):
+            if not _is_valid_url(u):
+                raise ValueError
+            add("856", f"42{sf}u{u}{sf}zTool manual")
+        self._add_constant(self._t856)
+
+        # 949
+        self._add_constant(self._t949)
+
+        # 960s
+        try:
+            barcodes = _barcodes2list(item.barcode)
+            item_type_code = self._template.item_type_code(item.loan_restriction)
+            cost = self._template.price(item.cost)
+        except ValueError:
+            raise ValueError(f"Bib without items: {item.t245}")
+        for barcode in barcodes:
+            add(
+                "960",
+                f"  {sf}i{barcode}{sf}l41tls{sf}p{cost}{sf}q4"
+                f"{sf}t{item_type_code}{sf}ri{sf}sg",
+            )
+
+        base_address = LEADER_LEN + len(self._directory) + 1
+        record_length = base_address + len(self._data) + 1
+        return b"".join(
+            (
+                b"%05d" % record_length,
+                self._leader_head,
+                b"%05d" % base_address,
+                self._leader_tail,
+                self._directory,
+                END_OF_FIELD.encode("utf-8"),
+                self._data,
+                END_OF_RECORD,
+            )
+        )
@@ -0,0 +1,79 @@
+"""
+Merging of produced MARC21 batches keeping only the latest version of each
+bib.
+
+Records are located and their 001 and 005 read with `src.marc_scan`, so no
+record is fully parsed. Only the location of the newest version of each
+control number is kept in memory and the selected records are copied to
+the output as slices of memory mapped batches.
+"""
+
+import mmap
+import os
+from collections.abc import Iterable
+
+from src.marc_scan import iter_fields, iter_records
+from src.output import open_temporary, sync
+
+
+def _control_no_and_timestamp(record: bytes) -> tuple[str | None, str]:
+    control_no = None
+    timestamp = ""
+    for tag, data in iter_fields(record, ("001", "005")):
+        if tag == "001" and control_no is None:
+            control_no = data.decode("utf-8")
+        elif tag == "005" and not timestamp:
+            timestamp = data.decode("utf-8")
+    return control_no, timestamp
+
+
+def merge_batches(files: Iterable[str], fh_out: str) -> tuple[int, int]:
+    """
+    Writes records of given MARC21 files to `fh_out`, keeping for each
+    control number only the record with the latest 005 (of records with equal
+    005 the one coming last). Records without 001 are all kept. Records are
+    written in the order they appear in `files`.
+
+    Returns numbers of records read and written.
+    """
+    files = list(files)
+    # control number (or location if missing) -> (005, file #, offset, length)
+    newest: dict = {}
+    read = 0
+    for file_no, file in enumerate(files):
+        with open(file, "rb") as fh:
+            for offset, record in iter_records(fh):
+                read += 1
+                control_no, timestamp = _control_no_and_timestamp(record)
+                key = control_no if control_no is not None else (file_no, offset)
+                current = newest.get(key)
+                if current is None or timestamp >= current[0]:
+                    newest[key] = (timestamp, file_no, offset, len(record))
+
+    selected = sorted(location[1:] for location in newest.values())
+    out, tmp_path = open_temporary(fh_out, prefix=".merged-")
+    try:
+        with out:
+            _copy_records(files, selected, out)
+            sync(out)
+        os.replace(tmp_path, fh_out)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return read, len(selected)
+
+
+def _copy_records(files: list[str], selected: list[tuple], out) -> None:
+    """Writes records at sorted (file #, offset, length) locations"""
+    position = 0
+    while position < len(selected):
+        file_no = selected[position][0]
+        with open(files[file_no], "rb") as fh:
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                with memoryview(mm) as view:
+                    while position < len(selected):
+                        record_file_no, offset, length = selected[position]
+                        if record_file_no != file_no:
+                            break
+                        out.write(view[offset : offset + length])
+                        position += 1
@@ -0,0 +1,53 @@
+"""
+Atomic replacement of output files.
+
+Writers put their output into a temporary file created next to the final
+one and move it in place only once it is complete, so a failed run never
+leaves a partially written file behind.
+"""
+
+import os
+import shutil
+import tempfile
+from collections.abc import Callable
+from io import BufferedReader, BufferedWriter
+from typing import BinaryIO
+
+
+def open_temporary(
+    fh_out: str,
+    prefix: str = ".tool-bibs-",
+    copy: Callable[[BufferedReader, BufferedWriter], object] | None = None,
+) -> tuple[BinaryIO, str]:
+    """
+    Creates a temporary file in the directory of `fh_out` to replace it and
+    returns it opened for writing along with its path. The file gets the
+    permissions of `fh_out` if it exists, the regular default ones otherwise.
+    With `copy` the content of an existing `fh_out` is carried over by calling
+    it with `fh_out` opened for reading and the temporary file.
+    """
+    out_dir = os.path.dirname(os.path.abspath(fh_out))
+    fd, tmp_path = tempfile.mkstemp(prefix=prefix, suffix=".tmp", dir=out_dir)
+    out = os.fdopen(fd, "wb")
+    try:
+        if os.path.exists(fh_out):
+            shutil.copymode(fh_out, tmp_path)
+            if copy is not None:
+                with open(fh_out, "rb") as existing:
+                    copy(existing, out)
+        else:
+            # mkstemp creates private files, use the regular default instead
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(tmp_path, 0o666 & ~umask)
+    except BaseException:
+        out.close()
+        os.remove(tmp_path)
+        raise
+    return out, tmp_path
+
+
+def sync(out: BinaryIO) -> None:
+    """Flushes a file and writes it through to disk"""
+    out.flush()
+    os.fsync(out.fileno())
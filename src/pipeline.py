@@ -0,0 +1,141 @@
+"""
+Pipelined stages of the crosswalk overlapping the sheet download with
+building and writing bibs.
+
+Rows are streamed by a fetch thread as the sheet downloads and serialized
+records are written by a writer thread. Stages hand data over through
+bounded queues, so memory stays flat when one stage is slower than the rest.
+"""
+
+import queue
+import threading
+from collections.abc import Callable, Iterator
+from typing import Any
+
+from src.downloader import URL, get_metadata
+from src.producer import MarcBatchWriter
+from src.reader import Item, read_data  # type: ignore
+
+
+QUEUE_SIZE = 256
+_DONE = object()
+
+
+class _Stopped(Exception):
+    """Aborts the download once rows are no longer consumed"""
+
+
+def stream_data(
+    status: str | None = None,
+    url: str = URL,
+    max_age: float | None = None,
+    offline: bool = False,
+    maxsize: int = QUEUE_SIZE,
+) -> Iterator[tuple[int, Item]]:
+    """
+    Yields (sheet row number, record) pairs of rows with given `status` while
+    the sheet downloads. The local copy of the sheet is refreshed on the way
+    as by `get_metadata`; if it is kept without downloading, its rows are
+    read with `read_data` instead. Returns number of rows read once exhausted.
+    """
+    rows: queue.Queue = queue.Queue(maxsize)
+    stop = threading.Event()
+
+    def put(value: Any) -> None:
+        while not stop.is_set():
+            try:
+                rows.put(value, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+        raise _Stopped
+
+    def fetch() -> None:
+        try:
+            get_metadata(url, max_age=max_age, offline=offline, on_row=put)
+            put(_DONE)
+        except _Stopped:
+            pass
+        except BaseException as exc:
+            try:
+                put(exc)
+            except _Stopped:
+                pass
+
+    thread = threading.Thread(target=fetch, name="fetch", daemon=True)
+    thread.start()
+    row_no = 1
+    try:
+        while True:
+            values = rows.get()
+            if values is _DONE:
+                break
+            if isinstance(values, BaseException):
+                raise values
+            row_no += 1
+            if status is not None and values[0] != status:
+                continue
+            yield row_no, Item._make(values)
+    finally:
+        stop.set()
+        thread.join()
+
+    if row_no == 1:
+        # nothing downloaded, the local copy is up to date
+        return (yield from read_data(status=status, numbered=True))
+    return row_no - 1
+
+
+class BackgroundWriter:
+    """
+    Writes records with a `MarcBatchWriter` in a separate thread.
+
+    `write` only queues a record; `before_write` is called in the writer
+    thread with the `state` passed along each record right before it is
+    written. An error of the writer thread is raised by the next `write`
+    or on exit.
+    """
+
+    def __init__(
+        self,
+        writer: MarcBatchWriter,
+        before_write: Callable[[Any], None] | None = None,
+        maxsize: int = QUEUE_SIZE,
+    ) -> None:
+        self.writer = writer
+        self.before_write = before_write
+        self._queue: queue.Queue = queue.Queue(maxsize)
+        self._error: BaseException | None = None
+        self._thread: threading.Thread | None = None
+
+    def __enter__(self) -> "BackgroundWriter":
+        self._thread = threading.Thread(target=self._run, name="write", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        while True:
+            entry = self._queue.get()
+            if entry is _DONE:
+                return
+            if self._error is not None:
+                continue  # drain the queue after a failure
+            data, state = entry
+            try:
+                if self.before_write is not None:
+                    self.before_write(state)
+                self.writer.write(data)
+            except BaseException as exc:
+                self._error = exc
+
+    def write(self, data: bytes, state: Any = None) -> None:
+        if self._error is not None:
+            raise self._error
+        self._queue.put((data, state))
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self._queue.put(_DONE)
+        if self._thread is not None:
+            self._thread.join()
+        if exc_type is None and self._error is not None:
+            raise self._error
@@ -1,18 +1,51 @@
+import os
+import shutil
 import warnings
+from collections import Counter
+from collections.abc import Callable, Iterable, Iterator
 from datetime import date, datetime
+from functools import lru_cache
+from typing import BinaryIO
 
 from pymarc import Field, Record, Subfield  # type: ignore
 
+from src.output import open_temporary, sync
 from src.reader import Item  # type: ignore
 
 
+# distinct subjects & manual urls memoized per process
+FIELD_CACHE_SIZE = 256
+
+
+def _is_valid_title(value: str) -> bool:
+    return bool(value.strip())
+
+
+def _is_valid_url(url: str) -> bool:
+    return url.startswith("https://")
+
+
+def _is_valid_barcode(barcode: str) -> bool:
+    return barcode.startswith("34444") and len(barcode) == 14
+
+
+def _is_valid_cost(value: str) -> bool:
+    try:
+        float(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _is_valid_loan_restriction(value: str) -> bool:
+    return value.lower() in ("yes", "no")
+
+
 def _barcodes2list(barcodes: str) -> list[str]:
-    barcodes_lst = [b.strip() for b in barcodes.split(";") if b.strip()]
+    barcodes_lst = _values2list(barcodes)
     for b in barcodes_lst:
-        if not b.startswith("34444"):
+        if not _is_valid_barcode(b):
             raise ValueError("Invalid barcode.")
-        if len(b) != 14:
-            raise ValueError("Invalid barcode")
 
     if not barcodes_lst:
         raise ValueError("Missing barcode(s).")
@@ -21,8 +54,9 @@ def _barcodes2list(barcodes: str) -> list[str]:
 
 
 def _convert_price(value: str) -> str:
-    value_as_float = float(value)
-    return f"{value_as_float:.2f}"
+    if not _is_valid_cost(value):
+        raise ValueError(f"Invalid cost: {value!r}")
+    return f"{float(value):.2f}"
 
 
 def _date_today():
@@ -33,6 +67,10 @@ def _values2list(value: str) -> list[str]:
     return [v.strip() for v in value.split(";") if v.strip()]
 
 
+def _subjects2list(value: str) -> list[str]:
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+
 def _enforce_trailing_period(value: str) -> str:
     value = value.strip()
     if value:
@@ -58,18 +96,21 @@ def _enforce_no_trailing_punctuation(value: str) -> str:
 
 
 def _get_item_type_code(loan_restriction: str) -> str:
+    if not _is_valid_loan_restriction(loan_restriction):
+        warnings.warn("Invalid loan restrition value")
     if loan_restriction.lower() == "yes":
         return "58"
-    elif loan_restriction.lower() == "no":
-        return "59"
     else:
-        warnings.warn("Invalid loan restrition value")
         return "59"
 
 
-def _make_t001(value: int | str) -> Field:
+def _control_no(value: int | str) -> str:
     sequenceNo = str(value).zfill(7)
-    return Field(tag="001", data=f"bkl-tll-{sequenceNo}")
+    return f"bkl-tll-{sequenceNo}"
+
+
+def _make_t001(value: int | str) -> Field:
+    return Field(tag="001", data=_control_no(value))
 
 
 def _make_t028(value: str) -> list[Field]:
@@ -83,7 +124,7 @@ def _make_t028(value: str) -> list[Field]:
 
 
 def _make_t245(value: str) -> Field:
-    if value.strip():
+    if _is_valid_title(value):
         return Field(
             tag="245",
             indicators=["0", "0"],
@@ -146,54 +187,105 @@ def _make_t520(value: str) -> Field:
         return None
 
 
-def _make_t690(value: str) -> list[Field]:
+def _make_subject_field(subject: str) -> Field:
+    return Field(
+        tag="690",
+        indicators=[" ", "4"],
+        subfields=[Subfield("a", f"{subject}.")],
+    )
+
+
+def _make_url_field(url: str, label: str) -> Field:
+    return Field(
+        tag="856",
+        indicators=["4", "2"],
+        subfields=[
+            Subfield("u", url),
+            Subfield("z", label),
+        ],
+    )
+
+
+@lru_cache(maxsize=FIELD_CACHE_SIZE)
+def _cached_subject_field(subject: str) -> Field:
+    return _make_subject_field(subject)
+
+
+@lru_cache(maxsize=FIELD_CACHE_SIZE)
+def _cached_url_field(url: str, label: str) -> Field:
+    return _make_url_field(url, label)
+
+
+def _copy_field(field: Field) -> Field:
+    # subfields are immutable named tuples and can be shared between copies
+    return Field(
+        tag=field.tag,
+        indicators=list(field.indicators),
+        subfields=list(field.subfields),
+    )
+
+
+def _make_t690(value: str, memoized: bool = False) -> list[Field]:
     """
     No need to enfore punctuation since the values are controlled
     by the sheet.
+
+    With `memoized` the field of each subject is built once per process and
+    records receive copies of it.
     """
     fields = []
-    subjects = [v.strip() for v in value.split(",") if v.strip()]
+    subjects = _subjects2list(value)
     for s in subjects:
-        fields.append(
-            Field(
-                tag="690",
-                indicators=[" ", "4"],
-                subfields=[Subfield("a", f"{s}.")],
-            )
-        )
+        if memoized:
+            fields.append(_copy_field(_cached_subject_field(s)))
+        else:
+            fields.append(_make_subject_field(s))
     if not fields:
         raise Warning("No subjects tags were provided.")
     return fields
 
 
-def _make_t856(value: str, label: str) -> list[Field]:
+def _make_t856(value: str, label: str, memoized: bool = False) -> list[Field]:
     fields = []
     urls = _values2list(value)
     for u in urls:
-        if not u.startswith("https://"):
+        if not _is_valid_url(u):
             raise ValueError
-        fields.append(
-            Field(
-                tag="856",
-                indicators=["4", "2"],
-                subfields=[
-                    Subfield("u", u.strip()),
-                    Subfield("z", label),
-                ],
-            )
-        )
+        if memoized:
+            fields.append(_copy_field(_cached_url_field(u, label)))
+        else:
+            fields.append(_make_url_field(u, label))
     return fields
 
 
+def field_cache_info() -> dict:
+    """Returns hits and misses of the memoized field builders"""
+    return {
+        "690": _cached_subject_field.cache_info(),
+        "856": _cached_url_field.cache_info(),
+    }
+
+
+def clear_field_cache() -> None:
+    _cached_subject_field.cache_clear()
+    _cached_url_field.cache_clear()
+
+
 def _make_t960(
     barcodes: str, cost: str, loan_restriction: str = "NO", status: str = "g"
 ) -> list[Field]:
-    fields = []
     barcodes_lst = _barcodes2list(barcodes)
 
     item_type_code = _get_item_type_code(loan_restriction)
     formatted_cost = _convert_price(cost)
 
+    return _make_item_fields(barcodes_lst, formatted_cost, item_type_code, status)
+
+
+def _make_item_fields(
+    barcodes_lst: list[str], formatted_cost: str, item_type_code: str, status: str
+) -> list[Field]:
+    fields = []
     for barcode in barcodes_lst:
         fields.append(
             Field(
@@ -217,134 +309,325 @@ def _make_t949():
     return Field(tag="949", indicators=[" ", " "], subfields=[Subfield("a", "*b2=r;")])
 
 
-def generate_bib(item: Item, control_no_sequence: int) -> Record:
+class BibTemplate:
+    """
+    Constant parts of a tool bib prebuilt once per run.
+
+    Fields held by the template are shared by all records generated with it
+    and must not be modified. The template also resolves each distinct loan
+    restriction and cost value only once. Instead of warning about invalid
+    loan restrictions it counts rows with each invalid value in
+    `invalid_loan_restrictions`.
+    """
+
+    def __init__(self) -> None:
+        self.leader = "00000nrm a2200000M  4500"
+        self.t003 = Field(tag="003", data="NBPu")
+        self.t008 = Field(
+            tag="008", data=f"{_date_today()}s20uu    xx                ||zxx d"
+        )
+        self.t099 = Field(
+            tag="099", indicators=[" ", " "], subfields=[Subfield("a", "TOOL")]
+        )
+        self.t300 = Field(
+            tag="300", indicators=[" ", " "], subfields=[Subfield("a", "1 tool")]
+        )
+        # RDA 3xx tags
+        self.t33x = [
+            Field(
+                tag="336",
+                indicators=[" ", " "],
+                subfields=[
+                    Subfield("a", "three-dimensional form"),
+                    Subfield("b", "tdf"),
+                    Subfield("2", "rdacontent"),
+                ],
+            ),
+            Field(
+                tag="337",
+                indicators=[" ", " "],
+                subfields=[
+                    Subfield("a", "unmediated"),
+                    Subfield("b", "n"),
+                    Subfield("2", "rdamedia"),
+                ],
+            ),
+            Field(
+                tag="338",
+                indicators=[" ", " "],
+                subfields=[
+                    Subfield("a", "object"),
+                    Subfield("b", "nr"),
+                    Subfield("2", "rdacarrier"),
+                ],
+            ),
+        ]
+        self.t856 = _make_t856(
+            "https://www.bklynlibrary.org/tool-library", "Tool library webpage"
+        )[0]
+        self.t949 = _make_t949()
+        self._item_type_codes: dict[str, str] = {}
+        self._prices: dict[str, str] = {}
+        self.invalid_loan_restrictions: Counter[str] = Counter()
+
+    def item_type_code(self, loan_restriction: str) -> str:
+        """
+        Returns `_get_item_type_code` of the value, counting invalid values
+        instead of warning about them
+        """
+        try:
+            return self._item_type_codes[loan_restriction]
+        except KeyError:
+            pass
+        if not _is_valid_loan_restriction(loan_restriction):
+            self.invalid_loan_restrictions[loan_restriction] += 1
+            return "59"
+        code = _get_item_type_code(loan_restriction)
+        self._item_type_codes[loan_restriction] = code
+        return code
+
+    def price(self, cost: str) -> str:
+        """Returns `_convert_price` of the value"""
+        try:
+            return self._prices[cost]
+        except KeyError:
+            price = _convert_price(cost)
+            self._prices[cost] = price
+            return price
+
+
+def generate_bib(
+    item: Item, control_no_sequence: int, template: BibTemplate | None = None
+) -> Record:
+    """
+    Creates a tool bib from a sheet row. Fields are appended in tag order,
+    pass a `template` shared by the whole run to avoid rebuilding its
+    constant fields for each record. Without a template an invalid loan
+    restriction is warned about, a template counts it instead.
+    """
+    if template is None:
+        template = BibTemplate()
+        item_type_code = _get_item_type_code
+    else:
+        item_type_code = template.item_type_code
+
     bib = Record()
-    bib.leader = "00000nrm a2200000M  4500"
+    bib.leader = template.leader
 
     # 001
     controlNoTag = _make_t001(control_no_sequence)
-    bib.add_ordered_field(controlNoTag)
+    bib.add_field(controlNoTag)
 
     # 003
-    bib.add_ordered_field(Field(tag="003", data="NBPu"))
+    bib.add_field(template.t003)
 
     # 005
-    bib.add_ordered_field(
+    bib.add_field(
         Field(tag="005", data=datetime.strftime(datetime.now(), "%y%m%d%H%M%S.%f"))
     )
 
     # 008
-    today = _date_today()
-    bib.add_ordered_field(
-        Field(tag="008", data=f"{today}s20uu    xx                ||zxx d")
-    )
+    bib.add_field(template.t008)
 
     # 028
     skus = _make_t028(item.t028)
-    for s in skus:
-        bib.add_ordered_field(s)
+    bib.add_field(*skus)
 
     # 099
-    bib.add_ordered_field(
-        Field(tag="099", indicators=[" ", " "], subfields=[Subfield("a", "TOOL")])
-    )
+    bib.add_field(template.t099)
 
     # 245
     title_field = _make_t245(item.t245)
-    bib.add_ordered_field(title_field)
+    bib.add_field(title_field)
 
     # 246
     alt_titles = _make_t246(item.t246)
-    for a in alt_titles:
-        bib.add_ordered_field(a)
+    bib.add_field(*alt_titles)
 
     # 300 field
-    bib.add_ordered_field(
-        Field(tag="300", indicators=[" ", " "], subfields=[Subfield("a", "1 tool")])
-    )
+    bib.add_field(template.t300)
 
     # RDA 3xx tags
-    bib.add_ordered_field(
-        Field(
-            tag="336",
-            indicators=[" ", " "],
-            subfields=[
-                Subfield("a", "three-dimensional form"),
-                Subfield("b", "tdf"),
-                Subfield("2", "rdacontent"),
-            ],
-        )
-    )
-    bib.add_ordered_field(
-        Field(
-            tag="337",
-            indicators=[" ", " "],
-            subfields=[
-                Subfield("a", "unmediated"),
-                Subfield("b", "n"),
-                Subfield("2", "rdamedia"),
-            ],
-        )
-    )
-    bib.add_ordered_field(
-        Field(
-            tag="338",
-            indicators=[" ", " "],
-            subfields=[
-                Subfield("a", "object"),
-                Subfield("b", "nr"),
-                Subfield("2", "rdacarrier"),
-            ],
-        )
-    )
+    bib.add_field(*template.t33x)
 
     # 500
     notes_general = _make_t500(item.t500)
-    for n in notes_general:
-        bib.add_ordered_field(n)
+    bib.add_field(*notes_general)
 
     # 505
     note_content = _make_t505(item.t505)
     if note_content:
-        bib.add_ordered_field(_make_t505(item.t505))
+        bib.add_field(note_content)
 
     # 520
     summary = _make_t520(item.t520)
     if summary:
-        bib.add_ordered_field(_make_t520(item.t520))
+        bib.add_field(summary)
 
     # 690
-    subjects = _make_t690(item.t690)
-    for s in subjects:
-        bib.add_ordered_field(s)
+    subjects = _make_t690(item.t690, memoized=True)
+    bib.add_field(*subjects)
 
     # 856 with manual url
-    urls = _make_t856(item.t856, "Tool manual")
-    for u in urls:
-        bib.add_ordered_field(u)
+    urls = _make_t856(item.t856, "Tool manual", memoized=True)
+    bib.add_field(*urls)
 
-    program_url_tag = _make_t856(
-        "https://www.bklynlibrary.org/tool-library", "Tool library webpage"
-    )
-    bib.add_ordered_field(program_url_tag[0])
+    bib.add_field(template.t856)
+
+    # command tag 949
+    bib.add_field(template.t949)
 
     # item records 960s
     try:
-        items = _make_t960(item.barcode, item.cost, item.loan_restriction)
+        barcodes = _barcodes2list(item.barcode)
+        item_type = item_type_code(item.loan_restriction)
+        cost = template.price(item.cost)
     except ValueError:
         raise ValueError(f"Bib without items: {item.t245}")
+    items = _make_item_fields(barcodes, cost, item_type, "g")
 
-    for i in items:
-        bib.add_ordered_field(i)
-
-    # command tag 949
-    command_tag = _make_t949()
-    bib.add_ordered_field(command_tag)
+    bib.add_field(*items)
 
     return bib
 
 
-def save2marc(bib: Record, fh_out: str) -> None:
-    """Appends MARC21 record to a file"""
-    with open(fh_out, "ab") as out:
-        out.write(bib.as_marc())
+_worker_template: BibTemplate | None = None
+_worker_serializer = None
+
+
+def _init_worker(fast_marc: bool = False) -> None:
+    global _worker_template, _worker_serializer
+    _worker_template = BibTemplate()
+    if fast_marc:
+        from src.marc_serializer import MarcSerializer
+
+        _worker_serializer = MarcSerializer(_worker_template)
+
+
+def _generate_marc(item: Item, control_no_sequence: int) -> bytes:
+    if _worker_serializer is not None:
+        return _worker_serializer.serialize(item, control_no_sequence)
+    return generate_bib(item, control_no_sequence, _worker_template).as_marc()
+
+
+def generate_bibs_parallel(
+    items: list[Item],
+    start_sequence: int | list[int],
+    workers: int,
+    chunk_size: int | None = None,
+    fast_marc: bool = False,
+) -> Iterator[bytes]:
+    """
+    Generates bibs over a pool of processes and yields them serialized to
+    MARC21 in the same order as `items`. Control numbers are assigned up front
+    starting with `start_sequence`, or taken from it if it is a list of the
+    sequence of each item. With `fast_marc` records are serialized directly by
+    `src.marc_serializer.MarcSerializer`.
+    """
+    # process pool machinery is imported only when it is used
+    from concurrent.futures import ProcessPoolExecutor
+
+    if chunk_size is None:
+        chunk_size = max(1, len(items) // (workers * 4))
+    if isinstance(start_sequence, list):
+        sequences: Iterable[int] = start_sequence
+    else:
+        sequences = range(start_sequence, start_sequence + len(items))
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(fast_marc,)
+    ) as executor:
+        yield from executor.map(_generate_marc, items, sequences, chunksize=chunk_size)
+
+
+class MarcBatchWriter:
+    """
+    Buffered MARC21 writer keeping a single file handle open for a whole run.
+
+    Records are serialized into an in-memory buffer and flushed to disk every
+    `chunk_size` records. Output goes to a temporary file in the destination
+    directory which replaces `fh_out` only when the context exits cleanly, so
+    a failed run never leaves a partially written batch behind. Records
+    already present in `fh_out` are preserved and new ones appended after them.
+
+    With `on_flush` the temporary file is synced after every flush and the
+    callback receives its size, i.e. the end of the last complete record. The
+    temporary file of a failed run is then kept and the run can be continued
+    by passing it back as `tmp_path` along with that `offset`; anything past
+    the offset, like a partially written record, is truncated.
+    """
+
+    def __init__(
+        self,
+        fh_out: str,
+        chunk_size: int = 100,
+        on_flush: Callable[[int], None] | None = None,
+        tmp_path: str | None = None,
+        offset: int = 0,
+    ) -> None:
+        if chunk_size < 1:
+            raise ValueError("Chunk size must be a positive integer.")
+        self.fh_out = fh_out
+        self.chunk_size = chunk_size
+        self.records_written = 0
+        self.bytes_written = 0
+        self.on_flush = on_flush
+        self.tmp_path = tmp_path
+        self._offset = offset
+        self._buffer: list[bytes] = []
+        self._out: BinaryIO | None = None
+
+    def __enter__(self) -> "MarcBatchWriter":
+        if self.tmp_path is not None:
+            out = open(self.tmp_path, "r+b")
+            out.truncate(self._offset)
+            out.seek(self._offset)
+            self._out = out
+            return self
+        self._out, self.tmp_path = open_temporary(self.fh_out, copy=shutil.copyfileobj)
+        return self
+
+    def _opened(self) -> tuple[BinaryIO, str]:
+        """Returns the temporary file and its path, set within the with block"""
+        if self._out is None or self.tmp_path is None:
+            raise ValueError("MarcBatchWriter is used outside of its with block.")
+        return self._out, self.tmp_path
+
+    def write(self, bib: Record | bytes) -> None:
+        """Buffers a record (or its MARC21 serialization) for writing"""
+        if isinstance(bib, Record):
+            bib = bib.as_marc()
+        self._buffer.append(bib)
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes buffered records to the temporary file"""
+        out, _ = self._opened()
+        if self._buffer:
+            self.bytes_written += out.write(b"".join(self._buffer))
+            self.records_written += len(self._buffer)
+            self._buffer.clear()
+        if self.on_flush is not None:
+            sync(out)
+            self.on_flush(out.tell())
+        else:
+            out.flush()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        out, tmp_path = self._opened()
+        completed = False
+        try:
+            if exc_type is None:
+                self.flush()
+                sync(out)
+                completed = True
+        finally:
+            out.close()
+            self._out = None
+            if completed and (
+                self.records_written or self._offset or os.path.exists(self.fh_out)
+            ):
+                os.replace(tmp_path, self.fh_out)
+            elif completed or self.on_flush is None:
+                os.remove(tmp_path)
+            # otherwise output of the failed run is kept for resuming it
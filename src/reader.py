@@ -1,17 +1,136 @@
 # type: ignore
 
 import csv
+import sys
 from collections import namedtuple
+from collections.abc import Iterable
+from functools import lru_cache
+from operator import itemgetter
 
 from src.downloader import COL_NAMES
 
 
-Item = namedtuple("Item", COL_NAMES)
+class Item:
+    """
+    Row of the sheet.
 
+    Attributes are kept in slots and values of the low cardinality columns
+    (status, subjects, cost and loan restriction) are interned, so rows
+    repeating them share a single string. Like the namedtuple it replaces an
+    item is immutable, so it can be hashed.
+    """
 
-def read_data():
+    __slots__ = tuple(COL_NAMES)
+    _fields = tuple(COL_NAMES)
+
+    def __init__(
+        self,
+        status: str,
+        t245: str,
+        t246: str,
+        t028: str,
+        t520: str,
+        t690: str,
+        t500: str,
+        t505: str,
+        t856: str,
+        barcode: str,
+        cost: str,
+        loan_restriction: str,
+    ) -> None:
+        init = object.__setattr__
+        init(self, "status", sys.intern(status))
+        init(self, "t245", t245)
+        init(self, "t246", t246)
+        init(self, "t028", t028)
+        init(self, "t520", t520)
+        init(self, "t690", sys.intern(t690))
+        init(self, "t500", t500)
+        init(self, "t505", t505)
+        init(self, "t856", t856)
+        init(self, "barcode", barcode)
+        init(self, "cost", sys.intern(cost))
+        init(self, "loan_restriction", sys.intern(loan_restriction))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"can't set attribute {name!r} of Item")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"can't delete attribute {name!r} of Item")
+
+    @classmethod
+    def _make(cls, values) -> "Item":
+        return cls(*values)
+
+    def _asdict(self) -> dict[str, str]:
+        return {name: getattr(self, name) for name in self._fields}
+
+    def _replace(self, **changes) -> "Item":
+        unknown = changes.keys() - set(self._fields)
+        if unknown:
+            raise ValueError(f"Got unexpected field names: {sorted(unknown)!r}")
+        return Item(**{**self._asdict(), **changes})
+
+    def __iter__(self):
+        return (getattr(self, name) for name in self._fields)
+
+    def __len__(self) -> int:
+        return len(self._fields)
+
+    def __getitem__(self, index):
+        return tuple(self)[index]
+
+    def __reduce__(self):
+        return Item, tuple(self)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Item):
+            return NotImplemented
+        return tuple(self) == tuple(other)
+
+    def __hash__(self) -> int:
+        return hash(tuple(self))
+
+    def __repr__(self) -> str:
+        values = ", ".join(f"{name}={getattr(self, name)!r}" for name in self._fields)
+        return f"Item({values})"
+
+
+@lru_cache(maxsize=None)
+def _projection(fields: tuple[str, ...]):
+    """Returns record type of `fields` and getter of their values in a csv row"""
+    if fields == tuple(COL_NAMES):
+        return Item, None
+    indices = [COL_NAMES.index(f) for f in fields]
+    if len(indices) == 1:
+        return namedtuple("Item", fields), lambda row: (row[indices[0]],)
+    return namedtuple("Item", fields), itemgetter(*indices)
+
+
+def read_data(
+    status: str | None = None,
+    fields: Iterable[str] | None = None,
+    numbered: bool = False,
+):
+    """
+    Yields rows of the local copy of the sheet.
+
+    Rows with a `status` other than given are skipped before any record is
+    built and `fields` limits records to the named columns. With `numbered`
+    (sheet row number, record) pairs are yielded, the first data row being
+    row 2 of the sheet. Returns number of rows read once exhausted.
+    """
+    record, getter = _projection(tuple(COL_NAMES if fields is None else fields))
     with open("out/metadata.csv", "r") as csvfile:
         reader = csv.reader(csvfile)
         next(reader)  # skip the header
-        for item in map(Item._make, reader):
-            yield item
+        row_no = 1
+        for row_no, row in enumerate(reader, start=2):
+            if status is not None and row[0] != status:
+                continue
+            if getter is None:
+                item = Item._make(row)
+            else:
+                item = tuple.__new__(record, getter(row))
+            yield (row_no, item) if numbered else item
+    return row_no - 1
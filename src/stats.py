@@ -0,0 +1,107 @@
+"""
+Lightweight timing and counters of the crosswalk pipeline.
+
+Stages accumulate wall time, so a stage entered once per record (e.g.
+generating or writing bibs) reports its total over the whole run.
+"""
+
+import json
+import time
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from datetime import datetime
+
+
+STATS_PATH = "out/stats.jsonl"
+
+
+class PipelineStats:
+    def __init__(self, command: str) -> None:
+        self.command = command
+        self.started = datetime.now()
+        self.stages: dict[str, float] = {}
+        self.counters: dict[str, int] = {}
+        self.marks: dict[str, float] = {}
+        self._start = time.perf_counter()
+        self.elapsed = 0.0
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def count(self, counter: str, value: int = 1) -> None:
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+    @contextmanager
+    def stage(self, stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start)
+
+    def timed(
+        self, stage: str, iterable: Iterable, result_counter: str | None = None
+    ) -> Iterator:
+        """
+        Yields from `iterable` adding time spent producing each element to
+        `stage`. A number returned by an exhausted generator, e.g. rows read
+        by `read_data`, is added to `result_counter`.
+        """
+        iterator = iter(iterable)
+        perf_counter = time.perf_counter
+        while True:
+            start = perf_counter()
+            try:
+                element = next(iterator)
+            except StopIteration as exc:
+                self.add_time(stage, perf_counter() - start)
+                if result_counter and isinstance(exc.value, int):
+                    self.count(result_counter, exc.value)
+                return
+            self.add_time(stage, perf_counter() - start)
+            yield element
+
+    def mark(self, event: str) -> None:
+        """Records time since start of the run of the first `event`"""
+        if event not in self.marks:
+            self.marks[event] = time.perf_counter() - self._start
+
+    def finish(self) -> None:
+        self.elapsed = time.perf_counter() - self._start
+
+    @property
+    def records_per_sec(self) -> float:
+        processed = self.counters.get("rows_processed", 0)
+        return processed / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "command": self.command,
+            "started": self.started.isoformat(timespec="seconds"),
+            "elapsed": round(self.elapsed, 6),
+            "stages": {name: round(t, 6) for name, t in self.stages.items()},
+            "counters": dict(self.counters),
+            "marks": {name: round(t, 6) for name, t in self.marks.items()},
+            "records_per_sec": round(self.records_per_sec, 1),
+        }
+
+    def summary(self) -> str:
+        """Returns stats formatted as a table"""
+        lines = [f"{'Stage':<12}{'Time (s)':>10}{'Share':>8}"]
+        for name, seconds in self.stages.items():
+            share = seconds / self.elapsed if self.elapsed else 0.0
+            lines.append(f"{name:<12}{seconds:>10.3f}{share:>8.1%}")
+        lines.append(f"{'total':<12}{self.elapsed:>10.3f}")
+        lines.append("")
+        for name, value in self.counters.items():
+            lines.append(f"{name.replace('_', ' ').capitalize():<16}{value:>14,}")
+        lines.append(f"{'Records/sec':<16}{self.records_per_sec:>14,.1f}")
+        for name, seconds in self.marks.items():
+            label = f"{name.replace('_', ' ').capitalize()} (s)"
+            lines.append(f"{label:<16}{seconds:>14.3f}")
+        return "\n".join(lines)
+
+    def save(self, fh_out: str = STATS_PATH) -> None:
+        """Appends stats as a line of JSON to `fh_out`"""
+        with open(fh_out, "a") as jsonfile:
+            jsonfile.write(json.dumps(self.as_dict()) + "\n")
@@ -0,0 +1,115 @@
+import csv
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from pymarc import Field, Record, Subfield
+
+from src.downloader import COL_NAMES
+from src.reader import Item
+
+
+class _SheetHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests.append(self.headers)
+        etag = self.server.etag
+        if etag and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = self.server.body
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def sheet_server():
+    """Local stand-in for the Google Sheets CSV export"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _SheetHandler)
+    server.body = b""
+    server.etag = None
+    server.requests = []
+    server.url = f"http://127.0.0.1:{server.server_port}/"
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+    )
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def write_sheet(tmp_path, monkeypatch):
+    """
+    Runs test in a temporary directory and returns a function writing given
+    items as the local copy of the sheet (out/metadata.csv)
+    """
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "out").mkdir()
+
+    def write(items):
+        with open("out/metadata.csv", "w", newline="") as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(COL_NAMES)
+            writer.writerows(items)
+
+    return write
+
+
+def make_item(**kwargs):
+    """Returns a valid row of the sheet, with given values replaced"""
+    values = dict(
+        status="for processing",
+        t245="Foo",
+        t246="",
+        t028="12345",
+        t520="spam spam spam",
+        t690="Power tools,Garden tools",
+        t500="some note",
+        t505="bar, shrubbery",
+        t856="https://example.com",
+        barcode="34444000000000;34444000000001",
+        cost="9.99",
+        loan_restriction="NO",
+    )
+    values.update(kwargs)
+    return Item(**values)
+
+
+def make_bib(control_no=None, barcodes=(), timestamp=None, title="Foo"):
+    """
+    Returns MARC21 serialization of a bib with given control number (001),
+    timestamp (005), title (245) and items (960s)
+    """
+    bib = Record()
+    bib.leader = "00000nrm a2200000M  4500"
+    if control_no:
+        bib.add_field(Field(tag="001", data=control_no))
+    if timestamp:
+        bib.add_field(Field(tag="005", data=timestamp))
+    bib.add_field(
+        Field(tag="245", indicators=["0", "0"], subfields=[Subfield("a", title)])
+    )
+    for barcode in barcodes:
+        bib.add_field(
+            Field(
+                tag="960",
+                indicators=[" ", " "],
+                subfields=[Subfield("i", barcode), Subfield("l", "41tls")],
+            )
+        )
+    return bib.as_marc()
+
+
+def write_batch(path, bibs):
+    """Writes MARC21 records as a batch file"""
+    path.write_bytes(b"".join(bibs))
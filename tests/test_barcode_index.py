@@ -0,0 +1,155 @@
+import pytest
+
+from src import data_checker
+from src.barcode_index import BarcodeIndex
+from src.reader import Item
+
+
+def _item(barcode, t245="Foo"):
+    return Item(
+        status="completed",
+        t245=t245,
+        t246="",
+        t028="",
+        t520="",
+        t690="Power tools",
+        t500="",
+        t505="",
+        t856="",
+        barcode=barcode,
+        cost="9.99",
+        loan_restriction="NO",
+    )
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    return str(tmp_path / "barcodes.db")
+
+
+@pytest.fixture
+def sheet(write_sheet):
+    class Sheet(list):
+        def verify(self, index_path):
+            write_sheet(self)
+            data_checker.verify_barcodes(index_path)
+
+    return Sheet()
+
+
+@pytest.fixture
+def parsed(monkeypatch):
+    cells = []
+
+    def barcodes2list(value):
+        cells.append(value)
+        return [b.strip() for b in value.split(";") if b.strip()]
+
+    monkeypatch.setattr(data_checker, "_barcodes2list", barcodes2list)
+    return cells
+
+
+def test_barcode_index_record_bib(index_path):
+    with BarcodeIndex(index_path) as index:
+        index.record_bib(2, "34444000000000", ["34444000000000"], "bkl-tll-0000001")
+
+    with BarcodeIndex(index_path) as index:
+        assert index.indexed_rows() == {2: "34444000000000"}
+        assert index.owner("34444000000000") == 2
+        assert index.owner("34444000000001") is None
+        control_no = index.conn.execute("SELECT control_no FROM barcodes").fetchone()
+        assert control_no == ("bkl-tll-0000001",)
+
+
+def test_barcode_index_record_bib_keeps_other_owners(index_path):
+    with BarcodeIndex(index_path) as index:
+        index.add_barcodes(2, ["A"])
+        index.mark_indexed(2, "A")
+        assert index.record_bib(3, "A;B", ["A", "B"], "bkl-tll-0000001") == ["A"]
+        assert index.owner("A") == 2
+        assert index.owner("B") == 3
+        assert index.indexed_rows() == {2: "A"}
+
+
+def test_barcode_index_remove_rows(index_path):
+    with BarcodeIndex(index_path) as index:
+        index.record_bib(2, "A", ["A"], "bkl-tll-0000001")
+        index.record_bib(3, "B", ["B"], "bkl-tll-0000002")
+        index.record_bib(4, "C", ["C"], "bkl-tll-0000003")
+        index.remove_rows([2])
+        index.remove_rows_after(3)
+        assert index.indexed_rows() == {3: "B"}
+        assert index.owner("A") is None
+        assert index.owner("C") is None
+
+
+def test_barcode_index_rollback_on_error(index_path):
+    with pytest.raises(RuntimeError):
+        with BarcodeIndex(index_path) as index:
+            index.record_bib(2, "A", ["A"], "bkl-tll-0000001")
+            raise RuntimeError
+    with BarcodeIndex(index_path) as index:
+        assert index.indexed_rows() == {}
+
+
+def test_verify_barcodes_no_dups(index_path, sheet, capfd):
+    sheet.extend([_item("34444000000000"), _item("34444000000001;34444000000002")])
+    sheet.verify(index_path)
+    assert capfd.readouterr().out == "Success! No duplicate barcodes found.\n"
+
+
+def test_verify_barcodes_dups(index_path, sheet, capfd):
+    sheet.extend(
+        [
+            _item("34444000000000"),
+            _item("34444000000001;34444000000001", "Bar"),
+            _item("34444000000000", "Spam"),
+        ]
+    )
+    sheet.verify(index_path)
+    out = capfd.readouterr().out
+    assert out == (
+        "Found duplicate barcode: 34444000000001 for Bar\n"
+        "Found duplicate barcode: 34444000000000 for Spam\n"
+    )
+
+    # duplicates are reported until fixed
+    sheet.verify(index_path)
+    assert capfd.readouterr().out == out
+
+
+def test_verify_barcodes_checks_only_changed_rows(index_path, sheet, parsed, capfd):
+    sheet.extend([_item("34444000000000"), _item("34444000000001")])
+    sheet.verify(index_path)
+    assert parsed == ["34444000000000", "34444000000001"]
+
+    parsed.clear()
+    sheet.append(_item("34444000000002"))
+    sheet.verify(index_path)
+    assert parsed == ["34444000000002"]
+
+    parsed.clear()
+    sheet[0] = _item("34444000000002", "Bar")
+    sheet.verify(index_path)
+    assert parsed == ["34444000000002"]
+    assert "Found duplicate barcode: 34444000000002 for Bar" in capfd.readouterr().out
+
+
+def test_verify_barcodes_removed_rows(index_path, sheet, capfd):
+    sheet.extend([_item("34444000000000"), _item("34444000000001")])
+    sheet.verify(index_path)
+
+    del sheet[1]
+    sheet[0] = _item("34444000000001")
+    sheet.verify(index_path)
+    assert capfd.readouterr().out.endswith("Success! No duplicate barcodes found.\n")
+
+
+def test_verify_barcodes_against_created_bibs(index_path, sheet, capfd):
+    with BarcodeIndex(index_path) as index:
+        index.record_bib(2, "34444000000000", ["34444000000000"], "bkl-tll-0000001")
+    sheet.extend([_item("34444000000000"), _item("34444000000000", "Bar")])
+    sheet.verify(index_path)
+    assert capfd.readouterr().out == (
+        "Found duplicate barcode: 34444000000000 for Bar\n"
+    )
@@ -0,0 +1,78 @@
+import pytest
+
+from src.control_numbers import ControlNumberAllocator, highest_sequence
+from tests.conftest import make_bib, write_batch
+
+
+@pytest.fixture
+def sequence_path(tmp_path, monkeypatch):
+    """Runs test in a temporary directory, which has no MARC21 files yet"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "out").mkdir()
+    return str(tmp_path / "sequence.db")
+
+
+def test_highest_sequence(tmp_path):
+    batch = tmp_path / "tool-bibs-240101.mrc"
+    write_batch(
+        batch,
+        [
+            make_bib("bkl-tll-0000024"),
+            make_bib("bkl-tll-0000031"),
+            make_bib("ocm123"),
+            make_bib("bkl-tll-x"),
+        ],
+    )
+    assert highest_sequence(str(batch)) == 31
+
+
+def test_reserve(sequence_path):
+    with ControlNumberAllocator(sequence_path) as allocator:
+        with pytest.raises(ValueError):
+            allocator.reserve(10)
+        assert allocator.reserve(10, start=1) == 1
+        assert allocator.reserve(10) == 11
+        assert allocator.reserve(5, start=100) == 100
+        assert allocator.next_sequence() == 105
+    with ControlNumberAllocator(sequence_path) as allocator:
+        assert allocator.next_sequence() == 105
+        with pytest.raises(ValueError):
+            allocator.reserve(5, start=104)
+
+
+def test_reserve_seeded_by_existing_files(tmp_path, sequence_path):
+    write_batch(
+        tmp_path / "out" / "tool-bibs-240101.mrc", [make_bib("bkl-tll-0000024")]
+    )
+    with ControlNumberAllocator(sequence_path) as allocator:
+        with pytest.raises(ValueError):
+            allocator.reserve(10, start=24)
+        assert allocator.reserve(10) == 25
+        assert allocator.refresh() == 0
+
+        write_batch(
+            tmp_path / "out" / "tool-bibs-240102.mrc", [make_bib("bkl-tll-0000050")]
+        )
+        assert allocator.reserve(10) == 51
+
+
+def test_extend_and_release(sequence_path):
+    with ControlNumberAllocator(sequence_path) as allocator:
+        start = allocator.reserve(10, start=1)
+        assert allocator.extend(start + 10, 10) == start + 20
+        allocator.release(start + 20, start + 15)
+        assert allocator.next_sequence() == start + 15
+
+        other = allocator.reserve(10)
+        with pytest.raises(ValueError):
+            allocator.extend(start + 15, 10)
+        allocator.release(start + 15, start + 12)
+        assert allocator.next_sequence() == other + 10
+
+
+def test_concurrent_allocators(sequence_path):
+    first = ControlNumberAllocator(sequence_path)
+    second = ControlNumberAllocator(sequence_path)
+    with first, second:
+        starts = [first.reserve(10, 1), second.reserve(10), first.reserve(10)]
+    assert starts == [1, 11, 21]
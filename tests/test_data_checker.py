@@ -0,0 +1,95 @@
+import warnings
+
+import pytest
+
+from src.data_checker import validate_item, validate_rows
+from src.producer import generate_bib
+from tests.conftest import make_item
+
+
+def test_validate_item_valid():
+    assert validate_item(make_item()) == []
+
+
+@pytest.mark.parametrize(
+    "kwargs,expectation",
+    [
+        (dict(t245=" "), ["Missing title."]),
+        (dict(t690=" , "), ["No subjects tags were provided."]),
+        (
+            dict(t856="https://foo.com; ftp://bar.com"),
+            ["Invalid manual URL: ftp://bar.com"],
+        ),
+        (dict(barcode=" ; "), ["Missing barcode(s)."]),
+        (
+            dict(barcode="14444000000000; 344440000000001"),
+            [
+                "Invalid barcode: 14444000000000",
+                "Invalid barcode: 344440000000001",
+            ],
+        ),
+        (dict(cost="$9"), ["Invalid cost: '$9'"]),
+        (
+            dict(t245="", t690="", cost=""),
+            [
+                "Missing title.",
+                "No subjects tags were provided.",
+                "Invalid cost: ''",
+            ],
+        ),
+    ],
+)
+def test_validate_item_errors(kwargs, expectation):
+    assert validate_item(make_item(**kwargs)) == expectation
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        dict(),
+        dict(t245=""),
+        dict(t690=""),
+        dict(t856="http://example.com"),
+        dict(barcode=""),
+        dict(barcode="34444000000000; 3444400000000"),
+        dict(cost="nine"),
+        dict(loan_restriction="maybe"),
+    ],
+)
+def test_validate_item_matches_generate_bib(kwargs):
+    item = make_item(**kwargs)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        try:
+            generate_bib(item, 1)
+            failed = False
+        except (ValueError, Warning):
+            failed = True
+    assert bool(validate_item(item)) is failed
+
+
+def test_validate_rows(write_sheet, capfd):
+    items = [
+        make_item(),
+        make_item(status="completed", t245=""),
+        make_item(t245="Bar", barcode="foo", cost=""),
+        make_item(t245="Spam", loan_restriction="maybe"),
+    ]
+    write_sheet(items)
+
+    assert validate_rows() == 1
+    assert capfd.readouterr().out == (
+        "Row 4 (Bar): Invalid barcode: foo\n"
+        "Row 4 (Bar): Invalid cost: ''\n"
+        "Row 5 (Spam): Warning, invalid loan restriction value 'maybe', item will "
+        "not be restricted.\n"
+        "Found errors in 1 of 3 rows marked for processing.\n"
+    )
+
+
+def test_validate_rows_valid(write_sheet, capfd):
+    write_sheet([make_item()])
+    assert validate_rows() == 0
+    assert capfd.readouterr().out == (
+        "Success! All 1 rows marked for processing are valid.\n"
+    )
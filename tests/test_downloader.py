@@ -1,9 +1,16 @@
 from contextlib import nullcontext as does_not_raise
 
 import csv
+import hashlib
+import json
+
+import pytest
 
 from src.downloader import get_metadata, COL_NAMES
 
+SHEET_HEADER = "Timestamp,Status,Title,Alt titles,SKU,Summary,Subjects,Notes,"
+SHEET_HEADER += "Contents,Manual,Barcodes,Cost,Restricted,Control #"
+
 
 def test_get_metadata():
     with does_not_raise():
@@ -14,3 +21,116 @@ def test_get_metadata():
             header = next(reader)
 
     assert header == COL_NAMES
+
+
+def test_get_metadata_local_sheet(sheet_server, tmp_path):
+    sheet_server.body = "\r\n".join(
+        [
+            SHEET_HEADER,
+            '1/1/2024,for processing,Drill,,123,"Drills, holes.",Power tools,,,'
+            "https://example.com,34444000000000,9,YES,24",
+            "1/2/2024,completed,Saw",
+            "",
+        ]
+    ).encode("utf-8")
+    fh_out = tmp_path / "metadata.csv"
+
+    get_metadata(sheet_server.url, str(fh_out))
+
+    with open(fh_out, "r", newline="") as csvfile:
+        rows = list(csv.reader(csvfile))
+
+    assert rows[0] == COL_NAMES
+    assert rows[1] == [
+        "for processing",
+        "Drill",
+        "",
+        "123",
+        "Drills, holes.",
+        "Power tools",
+        "",
+        "",
+        "https://example.com",
+        "34444000000000",
+        "9",
+        "YES",
+    ]
+    assert rows[2] == ["completed", "Saw"] + [""] * 10
+    assert len(rows) == 3
+
+
+SHEET = "\r\n".join([SHEET_HEADER, "1/2/2024,completed,Saw"]).encode("utf-8")
+
+
+def test_get_metadata_writes_cache(sheet_server, tmp_path):
+    sheet_server.body = SHEET
+    sheet_server.etag = '"v1"'
+    fh_out = tmp_path / "metadata.csv"
+
+    assert get_metadata(sheet_server.url, str(fh_out)) is True
+
+    with open(tmp_path / "metadata.json", "r") as jsonfile:
+        cache = json.load(jsonfile)
+    assert cache["url"] == sheet_server.url
+    assert cache["etag"] == '"v1"'
+    assert cache["sha256"] == hashlib.sha256(fh_out.read_bytes()).hexdigest()
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "metadata.csv",
+        "metadata.json",
+    ]
+
+
+def test_get_metadata_not_modified(sheet_server, tmp_path):
+    sheet_server.body = SHEET
+    sheet_server.etag = '"v1"'
+    fh_out = tmp_path / "metadata.csv"
+    get_metadata(sheet_server.url, str(fh_out))
+    inode = fh_out.stat().st_ino
+
+    assert get_metadata(sheet_server.url, str(fh_out)) is False
+    assert sheet_server.requests[-1]["If-None-Match"] == '"v1"'
+    assert fh_out.stat().st_ino == inode
+
+
+def test_get_metadata_unchanged_content(sheet_server, tmp_path):
+    sheet_server.body = SHEET
+    fh_out = tmp_path / "metadata.csv"
+    get_metadata(sheet_server.url, str(fh_out))
+    inode = fh_out.stat().st_ino
+
+    assert get_metadata(sheet_server.url, str(fh_out)) is False
+    assert len(sheet_server.requests) == 2
+    assert fh_out.stat().st_ino == inode
+
+
+def test_get_metadata_changed_content(sheet_server, tmp_path):
+    sheet_server.body = SHEET
+    fh_out = tmp_path / "metadata.csv"
+    get_metadata(sheet_server.url, str(fh_out))
+
+    sheet_server.body = SHEET + b"\r\n1/3/2024,for processing,Hammer"
+    assert get_metadata(sheet_server.url, str(fh_out)) is True
+    with open(fh_out, "r", newline="") as csvfile:
+        assert len(list(csv.reader(csvfile))) == 3
+
+
+def test_get_metadata_max_age(sheet_server, tmp_path):
+    sheet_server.body = SHEET
+    fh_out = tmp_path / "metadata.csv"
+    get_metadata(sheet_server.url, str(fh_out))
+
+    assert get_metadata(sheet_server.url, str(fh_out), max_age=3600) is False
+    assert len(sheet_server.requests) == 1
+
+    assert get_metadata(sheet_server.url, str(fh_out), max_age=0) is False
+    assert len(sheet_server.requests) == 2
+
+
+def test_get_metadata_offline(sheet_server, tmp_path):
+    fh_out = tmp_path / "metadata.csv"
+    with pytest.raises(FileNotFoundError):
+        get_metadata(sheet_server.url, str(fh_out), offline=True)
+
+    fh_out.write_text("foo")
+    assert get_metadata(sheet_server.url, str(fh_out), offline=True) is False
+    assert sheet_server.requests == []
@@ -0,0 +1,84 @@
+import io
+import json
+
+import pytest
+from pymarc import Field, Record, Subfield, XMLWriter, parse_xml_to_array
+
+from src.feeds import MarcJsonWriter, MarcXmlWriter, marc_to_dict, marc_to_xml
+from tests.conftest import make_bib
+
+
+def test_transcoding_matches_pymarc():
+    bib = Record(data=make_bib("bkl-tll-0000001", ["34444000000000"], title="Foo ü"))
+    bib.add_field(
+        Field(
+            tag="856",
+            indicators=["4", "0"],
+            subfields=[Subfield("u", "https://a.org/?a=1&b=<2>"), Subfield("z", '"')],
+        )
+    )
+    data = bib.as_marc()
+    bib = Record(data=data)
+
+    out = io.BytesIO()
+    writer = XMLWriter(out)
+    writer.write(bib)
+    writer.close(close_fh=False)
+    assert marc_to_xml(data).encode("utf-8") in out.getvalue()
+    assert marc_to_dict(data) == bib.as_dict()
+
+
+def test_marc_xml_writer(tmp_path):
+    fh_out = tmp_path / "tool-bibs-240101.xml"
+    with MarcXmlWriter(str(fh_out)) as writer:
+        writer.write(Record(data=make_bib("bkl-tll-0000001", title="Foo ü")))
+        writer.write(make_bib("bkl-tll-0000002", title="Foo ü"))
+    assert writer.records_written == 2
+
+    with MarcXmlWriter(str(fh_out)) as writer:
+        writer.write(make_bib("bkl-tll-0000003", title="Foo ü"))
+
+    content = fh_out.read_bytes()
+    assert content.count(b"<collection") == 1
+    assert content.endswith(b"</collection>")
+    bibs = parse_xml_to_array(str(fh_out))
+    assert [bib["001"].data for bib in bibs] == [
+        f"bkl-tll-000000{n}" for n in range(1, 4)
+    ]
+    assert bibs[0]["245"]["a"] == "Foo ü"
+    assert list(tmp_path.iterdir()) == [fh_out]
+
+
+def test_marc_xml_writer_rejects_other_files(tmp_path):
+    fh_out = tmp_path / "tool-bibs-240101.xml"
+    fh_out.write_bytes(b"<records/>")
+    with pytest.raises(ValueError):
+        with MarcXmlWriter(str(fh_out)):
+            pass
+    assert fh_out.read_bytes() == b"<records/>"
+    assert list(tmp_path.iterdir()) == [fh_out]
+
+
+def test_marc_json_writer(tmp_path):
+    fh_out = tmp_path / "tool-bibs-240101.jsonl"
+    with MarcJsonWriter(str(fh_out)) as writer:
+        writer.write(Record(data=make_bib("bkl-tll-0000001", title="Foo ü")))
+    with MarcJsonWriter(str(fh_out)) as writer:
+        writer.write(make_bib("bkl-tll-0000002", title="Foo ü"))
+
+    lines = fh_out.read_text(encoding="utf-8").splitlines()
+    bibs = [json.loads(line) for line in lines]
+    assert [bib["fields"][0]["001"] for bib in bibs] == [
+        "bkl-tll-0000001",
+        "bkl-tll-0000002",
+    ]
+    assert bibs[1]["fields"][1]["245"]["subfields"] == [{"a": "Foo ü"}]
+
+
+def test_feed_writer_discards_output_of_failed_run(tmp_path):
+    fh_out = tmp_path / "tool-bibs-240101.jsonl"
+    with pytest.raises(RuntimeError):
+        with MarcJsonWriter(str(fh_out)) as writer:
+            writer.write(make_bib("bkl-tll-0000001"))
+            raise RuntimeError
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,44 @@
+import pytest
+
+from src.fingerprints import RowFingerprints, fingerprint, row_key
+from src.reader import Item
+
+
+def _item(**kwargs):
+    values = dict.fromkeys(Item._fields, "")
+    values["barcode"] = "34444000000000; 34444000000001"
+    values.update(kwargs)
+    return Item(**values)
+
+
+@pytest.fixture
+def fingerprints_path(tmp_path):
+    return str(tmp_path / "fingerprints.db")
+
+
+def test_row_key():
+    assert row_key(_item()) == "34444000000000"
+    assert row_key(_item(barcode=" ; ")) is None
+
+
+def test_fingerprint():
+    assert fingerprint(_item(t245="Foo")) == fingerprint(_item(t245="Foo"))
+    assert fingerprint(_item(t245="Foo")) != fingerprint(_item(t245="Bar"))
+    assert fingerprint(_item(t245="Foo", t246="")) != fingerprint(
+        _item(t245="", t246="Foo")
+    )
+
+
+def test_row_fingerprints(fingerprints_path):
+    with RowFingerprints(fingerprints_path) as fingerprints:
+        fingerprints.record(_item(t245="Foo"), "bkl-tll-0000001")
+        fingerprints.record(_item(barcode=""), "bkl-tll-0000002")
+
+    with RowFingerprints(fingerprints_path) as fingerprints:
+        assert fingerprints.emitted() == {
+            "34444000000000": (fingerprint(_item(t245="Foo")), "bkl-tll-0000001")
+        }
+        fingerprints.record(_item(t245="Bar"), "bkl-tll-0000001")
+        assert fingerprints.emitted() == {
+            "34444000000000": (fingerprint(_item(t245="Bar")), "bkl-tll-0000001")
+        }
@@ -0,0 +1,129 @@
+import os
+import sqlite3
+
+import pytest
+
+from src import data_checker
+from src.history import HistoryIndex
+from src.marc_scan import read_record
+from src.reader import Item
+from tests.conftest import make_bib, write_batch
+
+
+def _item(status, t245, barcode):
+    values = dict.fromkeys(Item._fields, "")
+    values.update(status=status, t245=t245, barcode=barcode)
+    return Item(**values)
+
+
+@pytest.fixture
+def history_path(tmp_path):
+    return str(tmp_path / "history.db")
+
+
+def test_history_index_refresh(tmp_path, history_path):
+    first = tmp_path / "tool-bibs-240101.mrc"
+    second = tmp_path / "tool-bibs-240102.mrc"
+    write_batch(
+        first,
+        [
+            make_bib("bkl-tll-0000000", ["34444000000000"]),
+            make_bib("bkl-tll-0000001", ["34444000000001"]),
+        ],
+    )
+    write_batch(second, [make_bib("bkl-tll-0000000", ["34444000000001"])])
+
+    with HistoryIndex(history_path) as history:
+        assert history.refresh([str(first), str(second)]) == 2
+        assert history.find("34444000000000") == [str(first)]
+        assert history.find("34444000000001") == [str(first), str(second)]
+        assert history.find("34444000000002") == []
+
+    with HistoryIndex(history_path) as history:
+        assert history.refresh([str(first), str(second)]) == 0
+
+
+def test_history_index_refresh_changed_and_removed_files(tmp_path, history_path):
+    first = tmp_path / "tool-bibs-240101.mrc"
+    second = tmp_path / "tool-bibs-240102.mrc"
+    write_batch(first, [make_bib("bkl-tll-0000000", ["34444000000000"])])
+    write_batch(second, [make_bib("bkl-tll-0000000", ["34444000000001"])])
+    with HistoryIndex(history_path) as history:
+        history.refresh([str(first), str(second)])
+
+    write_batch(
+        first,
+        [
+            make_bib("bkl-tll-0000000", ["34444000000002"]),
+            make_bib("bkl-tll-0000001", ["34444000000003"]),
+        ],
+    )
+    stat = first.stat()
+    os.utime(first, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+    with HistoryIndex(history_path) as history:
+        assert history.refresh([str(first)]) == 1
+        assert history.find("34444000000000") == []
+        assert history.find("34444000000001") == []
+        assert history.find("34444000000003") == [str(first)]
+
+
+def test_verify_barcodes_against_history(write_sheet, tmp_path, capfd):
+    write_sheet(
+        [
+            _item("completed", "Foo", "34444000000000"),
+            _item("for processing", "Bar", "34444000000001; 34444000000000"),
+        ]
+    )
+    write_batch(
+        tmp_path / "out" / "tool-bibs-240101.mrc",
+        [make_bib("bkl-tll-0000000", ["34444000000000"])],
+    )
+
+    data_checker.verify_barcodes(against_history=True)
+    assert capfd.readouterr().out == (
+        "Found duplicate barcode: 34444000000000 for Bar\n"
+        "Found previously loaded barcode: 34444000000000 for Bar "
+        "in out/tool-bibs-240101.mrc\n"
+    )
+
+
+def test_history_index_locate(tmp_path, history_path):
+    first = tmp_path / "tool-bibs-240101.mrc"
+    second = tmp_path / "tool-bibs-240102.mrc"
+    write_batch(
+        first,
+        [
+            make_bib("bkl-tll-0000000", ["34444000000000"]),
+            make_bib("bkl-tll-0000001", ["34444000000001"]),
+        ],
+    )
+    write_batch(second, [make_bib("bkl-tll-0000000", ["34444000000001"])])
+
+    with HistoryIndex(history_path) as history:
+        history.refresh([str(first), str(second)])
+        assert history.counts() == (2, 3)
+        locations = history.locate(control_no="bkl-tll-0000001")
+        assert len(locations) == 1
+        assert read_record(*locations[0]) == first.read_bytes()[locations[0][1] :]
+        assert [loc[0] for loc in history.locate(barcode="34444000000001")] == [
+            str(first),
+            str(second),
+        ]
+        assert history.locate(control_no="bkl-tll-0000002") == []
+
+
+def test_history_index_rebuilds_old_schema(tmp_path, history_path):
+    conn = sqlite3.connect(history_path)
+    conn.executescript(
+        """
+        CREATE TABLE files (file TEXT PRIMARY KEY, size INTEGER, mtime INTEGER);
+        CREATE TABLE barcodes (barcode TEXT NOT NULL, file TEXT NOT NULL);
+        INSERT INTO files VALUES ('foo.mrc', 1, 1);
+        """
+    )
+    conn.close()
+    batch = tmp_path / "tool-bibs-240101.mrc"
+    write_batch(batch, [make_bib("bkl-tll-0000000", ["34444000000000"])])
+    with HistoryIndex(history_path) as history:
+        assert history.refresh([str(batch)]) == 1
+        assert history.find("34444000000000") == [str(batch)]
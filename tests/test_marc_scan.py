@@ -0,0 +1,78 @@
+import io
+
+import pytest
+
+from src.marc_scan import (
+    control_field,
+    item_barcodes,
+    iter_fields,
+    iter_records,
+    read_record,
+    subfield_values,
+)
+from tests.conftest import make_bib
+
+
+def test_iter_records():
+    first = make_bib("bkl-tll-0000001", ["34444000000000"])
+    second = make_bib("bkl-tll-0000002")
+    records = list(iter_records(io.BytesIO(first + second)))
+    assert records == [(0, first), (len(first), second)]
+
+
+def test_iter_records_empty():
+    assert list(iter_records(io.BytesIO(b""))) == []
+
+
+def test_iter_records_truncated():
+    data = make_bib("bkl-tll-0000001", ["34444000000000"])
+    with pytest.raises(ValueError):
+        list(iter_records(io.BytesIO(data + data[:-10])))
+
+
+def test_iter_records_invalid_length():
+    with pytest.raises(ValueError):
+        list(iter_records(io.BytesIO(b"foo bar")))
+
+
+def test_iter_fields():
+    record = make_bib(
+        "bkl-tll-0000001", ["34444000000000", "34444000000001"], title="Żółw"
+    )
+    assert [tag for tag, _ in iter_fields(record)] == ["001", "245", "960", "960"]
+    assert list(iter_fields(record, ("245",))) == [
+        ("245", "00\x1faŻółw".encode("utf-8"))
+    ]
+
+
+def test_control_field():
+    record = make_bib("bkl-tll-0000001")
+    assert control_field(record, "001") == "bkl-tll-0000001"
+    assert control_field(record, "005") is None
+
+
+def test_subfield_values():
+    assert subfield_values(b" 4\x1faFoo\x1fbBar\x1faSpam", "a") == ["Foo", "Spam"]
+    assert subfield_values(b" 4", "a") == []
+
+
+def test_item_barcodes():
+    record = make_bib("bkl-tll-0000001", ["34444000000000", "34444000000001"])
+    assert item_barcodes(record) == ["34444000000000", "34444000000001"]
+
+
+def test_read_record(tmp_path):
+    first = make_bib("bkl-tll-0000001", ["34444000000000"])
+    second = make_bib("bkl-tll-0000002")
+    path = tmp_path / "foo.mrc"
+    path.write_bytes(first + second)
+    assert read_record(str(path), len(first), len(second)) == second
+    assert read_record(str(path), 0, len(first)) == first
+
+
+@pytest.mark.parametrize("offset,length", [(1, 10), (0, 10), (10_000, 10)])
+def test_read_record_invalid_location(tmp_path, offset, length):
+    path = tmp_path / "foo.mrc"
+    path.write_bytes(make_bib("bkl-tll-0000001"))
+    with pytest.raises(ValueError):
+        read_record(str(path), offset, length)
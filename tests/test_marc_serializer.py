@@ -0,0 +1,82 @@
+import itertools
+
+import pytest
+
+from src.marc_serializer import MarcSerializer
+from src.producer import BibTemplate, generate_bib
+from tests.conftest import make_item
+
+TIMESTAMP = "240102030405.000006"
+
+
+def _corpus():
+    variants = dict(
+        t245=[" Foo Bar ", "Żółw & Co."],
+        t246=["", "Bar; Spam ;"],
+        t028=["", "12345; 2345A"],
+        t520=["", "a summary", "Déjà vu!"],
+        t690=["Power tools", " Hand tools, Garden tools ,"],
+        t500=["", "foo,; bar."],
+        t505=["", " foo. "],
+        t856=["", "https://www.foo.com; https://bar.com"],
+        barcode=["34444000000000", "34444000000000; 34444000000001 "],
+        cost=["9", "149.99"],
+        loan_restriction=["YES", "no"],
+    )
+    for values in itertools.product(*variants.values()):
+        yield make_item(**dict(zip(variants, values)))
+
+
+def _as_marc(item, n, template):
+    bib = generate_bib(item, n, template)
+    bib["005"].data = TIMESTAMP
+    return bib.as_marc()
+
+
+def test_serialize_matches_as_marc():
+    template = BibTemplate()
+    serializer = MarcSerializer(template)
+    count = 0
+    for n, item in enumerate(_corpus()):
+        expected = _as_marc(item, n, template)
+        assert serializer.serialize(item, n, TIMESTAMP) == expected
+        count += 1
+    assert count == 3072
+
+
+def test_serialize_default_timestamp():
+    data = MarcSerializer().serialize(make_item(), 24)
+    assert b"bkl-tll-0000024" in data
+    assert data[:5] == b"%05d" % len(data)
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        dict(t245=" "),
+        dict(t690=" , "),
+        dict(t856="ftp://example.com"),
+        dict(barcode=""),
+        dict(barcode="14444000000000"),
+        dict(cost="foo"),
+    ],
+)
+def test_serialize_invalid_row(kwargs):
+    item = make_item(**kwargs)
+    template = BibTemplate()
+
+    with pytest.raises(Exception) as expected:
+        generate_bib(item, 1, template)
+    with pytest.raises(Exception) as exc:
+        MarcSerializer(template).serialize(item, 1)
+
+    assert type(exc.value) is type(expected.value)
+    assert str(exc.value) == str(expected.value)
+
+
+def test_serialize_invalid_loan_restriction():
+    item = make_item(loan_restriction="maybe")
+    expected = _as_marc(item, 1, BibTemplate())
+    template = BibTemplate()
+    assert MarcSerializer(template).serialize(item, 1, TIMESTAMP) == expected
+    assert template.invalid_loan_restrictions == {"maybe": 1}
@@ -0,0 +1,44 @@
+import pytest
+from pymarc import MARCReader
+
+from src.merge import merge_batches
+from tests.conftest import make_bib
+
+
+def test_merge_batches(tmp_path):
+    first = tmp_path / "tool-bibs-240101.mrc"
+    second = tmp_path / "tool-bibs-240102.mrc"
+    old = make_bib("bkl-tll-0000001", timestamp="240101120000.0", title="old")
+    kept = make_bib("bkl-tll-0000002", timestamp="240101120000.0")
+    orphan = make_bib()
+    new = make_bib("bkl-tll-0000001", timestamp="240102120000.0", title="new")
+    first.write_bytes(old + kept + orphan)
+    second.write_bytes(new + orphan)
+    fh_out = tmp_path / "merged.mrc"
+
+    assert merge_batches([str(first), str(second)], str(fh_out)) == (5, 4)
+    assert fh_out.read_bytes() == kept + orphan + new + orphan
+    assert len(list(MARCReader(fh_out.read_bytes()))) == 4
+
+
+def test_merge_batches_keeps_newest_regardless_of_file_order(tmp_path):
+    first = tmp_path / "a.mrc"
+    second = tmp_path / "b.mrc"
+    newer = make_bib("bkl-tll-0000001", timestamp="240102120000.0", title="newer")
+    first.write_bytes(newer)
+    second.write_bytes(
+        make_bib("bkl-tll-0000001", timestamp="240101120000.0", title="older")
+    )
+    fh_out = tmp_path / "merged.mrc"
+
+    assert merge_batches([str(first), str(second)], str(fh_out)) == (2, 1)
+    assert fh_out.read_bytes() == newer
+
+
+def test_merge_batches_invalid_file(tmp_path):
+    batch = tmp_path / "a.mrc"
+    batch.write_bytes(make_bib("bkl-tll-0000001", timestamp="240101120000.0")[:-10])
+    fh_out = tmp_path / "merged.mrc"
+    with pytest.raises(ValueError):
+        merge_batches([str(batch)], str(fh_out))
+    assert [p.name for p in tmp_path.iterdir()] == ["a.mrc"]
@@ -0,0 +1,99 @@
+import threading
+
+import pytest
+
+from src.downloader import get_metadata
+from src.pipeline import BackgroundWriter, stream_data
+from src.producer import MarcBatchWriter
+from src.reader import Item, read_data
+
+
+SHEET_HEADER = "Timestamp,Status,Title,Alt titles,SKU,Summary,Subjects,Notes,"
+SHEET_HEADER += "Contents,Manual,Barcodes,Cost,Restricted,Control #"
+
+
+def _sheet(rows):
+    lines = [SHEET_HEADER]
+    for n, status in enumerate(rows):
+        lines.append(f"1/1/2024,{status},Drill {n},,123,,Power tools")
+    return "\r\n".join(lines).encode("utf-8")
+
+
+def test_stream_data(sheet_server, write_sheet):
+    sheet_server.body = _sheet(["for processing", "completed", "for processing"])
+
+    rows = list(stream_data("for processing", sheet_server.url))
+
+    assert [(row, item.t245) for row, item in rows] == [(2, "Drill 0"), (4, "Drill 2")]
+    assert isinstance(rows[0][1], Item)
+    assert list(read_data(status="for processing", numbered=True)) == rows
+
+
+def test_stream_data_returns_rows_read(sheet_server, write_sheet):
+    sheet_server.body = _sheet(["completed", "for processing"])
+    rows = stream_data("for processing", sheet_server.url)
+    assert next(rows)[0] == 3
+    with pytest.raises(StopIteration) as exc:
+        next(rows)
+    assert exc.value.value == 2
+
+
+def test_stream_data_local_copy(sheet_server, write_sheet):
+    sheet_server.body = _sheet(["for processing", "completed"])
+    sheet_server.etag = '"v1"'
+    get_metadata(sheet_server.url)
+
+    rows = list(stream_data("for processing", sheet_server.url))
+    assert len(sheet_server.requests) == 2
+    assert [(row, item.t245) for row, item in rows] == [(2, "Drill 0")]
+
+    rows = list(stream_data(url=sheet_server.url, offline=True))
+    assert len(sheet_server.requests) == 2
+    assert [(row, item.t245) for row, item in rows] == [(2, "Drill 0"), (3, "Drill 1")]
+
+
+def test_stream_data_writes_local_copy(sheet_server, write_sheet, tmp_path):
+    sheet_server.body = _sheet(["for processing"] * 10)
+    list(stream_data(url=sheet_server.url))
+    streamed = (tmp_path / "out" / "metadata.csv").read_bytes()
+
+    get_metadata(sheet_server.url, str(tmp_path / "expected.csv"))
+    assert streamed == (tmp_path / "expected.csv").read_bytes()
+
+
+def test_stream_data_stopped_early(sheet_server, write_sheet):
+    sheet_server.body = _sheet(["for processing"] * 100)
+    rows = stream_data(url=sheet_server.url, maxsize=1)
+    next(rows)
+    rows.close()
+    assert [t.name for t in threading.enumerate() if t.name == "fetch"] == []
+
+
+def test_stream_data_download_error(sheet_server, write_sheet):
+    with pytest.raises(OSError):
+        list(stream_data(url="foo://bar"))
+
+
+def test_background_writer(tmp_path):
+    fh_out = tmp_path / "foo.mrc"
+    states = []
+    with MarcBatchWriter(str(fh_out), chunk_size=2) as writer:
+        with BackgroundWriter(writer, before_write=states.append) as background:
+            for n in range(5):
+                background.write(b"%05d" % n, n)
+    assert states == [0, 1, 2, 3, 4]
+    assert fh_out.read_bytes() == b"".join(b"%05d" % n for n in range(5))
+
+
+def test_background_writer_error(tmp_path):
+    def fail(state):
+        if state == 1:
+            raise RuntimeError
+
+    fh_out = tmp_path / "foo.mrc"
+    with pytest.raises(RuntimeError):
+        with MarcBatchWriter(str(fh_out)) as writer:
+            with BackgroundWriter(writer, before_write=fail) as background:
+                for n in range(3):
+                    background.write(b"%05d" % n, n)
+    assert not fh_out.exists()
@@ -1,15 +1,22 @@
+import tracemalloc
+import warnings
 from datetime import date
 
 import pytest
-from pymarc import Field, Record
+from pymarc import Field, MARCReader, Record, Subfield
 
 from src.producer import (
+    BibTemplate,
     _barcodes2list,
     _convert_price,
     _date_today,
     _enforce_no_trailing_punctuation,
     _enforce_trailing_period,
     _get_item_type_code,
+    _is_valid_barcode,
+    _is_valid_cost,
+    _is_valid_title,
+    _is_valid_url,
     _make_t001,
     _make_t028,
     _make_t245,
@@ -21,8 +28,13 @@ from src.producer import (
     _make_t856,
     _make_t949,
     _make_t960,
+    _subjects2list,
     _values2list,
+    clear_field_cache,
+    field_cache_info,
     generate_bib,
+    generate_bibs_parallel,
+    MarcBatchWriter,
 )
 from src.reader import Item
 
@@ -52,6 +64,33 @@ def test_barcodes2list():
     assert barcodes[2] == "34444000000002"
 
 
+@pytest.mark.parametrize(
+    "predicate,valid,invalid",
+    [
+        (_is_valid_title, "Foo", " "),
+        (_is_valid_url, "https://foo.com", "http://foo.com"),
+        (_is_valid_barcode, "34444000000000", "14444000000000"),
+        (_is_valid_barcode, "34444000000000", "3444400000000"),
+        (_is_valid_cost, "9.99", "$9.99"),
+    ],
+)
+def test_field_predicates(predicate, valid, invalid):
+    assert predicate(valid) is True
+    assert predicate(invalid) is False
+
+
+def test_subjects2list():
+    assert _subjects2list(" Power tools,, Garden tools ") == [
+        "Power tools",
+        "Garden tools",
+    ]
+
+
+def test_convert_price_invalid():
+    with pytest.raises(ValueError):
+        _convert_price("nine")
+
+
 @pytest.mark.parametrize(
     "arg,expectation",
     [("9", "9.00"), ("149.99", "149.99"), ("7.0", "7.00"), ("0.9", "0.90")],
@@ -397,3 +436,348 @@ def test_generate_bib_without_barcodes():
     with pytest.raises(ValueError) as exc:
         generate_bib(item, 24)
     assert str(exc.value) == "Bib without items: Foo"
+
+
+def _sample_bibs(count):
+    bibs = []
+    for n in range(count):
+        bib = Record()
+        bib.add_field(_make_t001(n))
+        bibs.append(bib)
+    return bibs
+
+
+def test_marc_batch_writer(tmp_path):
+    fh_out = tmp_path / "foo.mrc"
+    bibs = _sample_bibs(5)
+    with MarcBatchWriter(str(fh_out), chunk_size=2) as writer:
+        for bib in bibs:
+            writer.write(bib)
+        assert not fh_out.exists()
+
+    assert writer.records_written == 5
+    assert fh_out.read_bytes() == b"".join(b.as_marc() for b in bibs)
+    assert [p.name for p in tmp_path.iterdir()] == ["foo.mrc"]
+
+
+def test_marc_batch_writer_accepts_bytes(tmp_path):
+    fh_out = tmp_path / "foo.mrc"
+    bib = _sample_bibs(1)[0]
+    with MarcBatchWriter(str(fh_out)) as writer:
+        writer.write(bib.as_marc())
+    assert fh_out.read_bytes() == bib.as_marc()
+
+
+def test_marc_batch_writer_appends_to_existing_file(tmp_path):
+    fh_out = tmp_path / "foo.mrc"
+    first, second = _sample_bibs(2)
+    fh_out.write_bytes(first.as_marc())
+    with MarcBatchWriter(str(fh_out)) as writer:
+        writer.write(second)
+    assert fh_out.read_bytes() == first.as_marc() + second.as_marc()
+
+
+def test_marc_batch_writer_no_records(tmp_path):
+    fh_out = tmp_path / "foo.mrc"
+    with MarcBatchWriter(str(fh_out)):
+        pass
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_marc_batch_writer_error_leaves_file_untouched(tmp_path):
+    fh_out = tmp_path / "foo.mrc"
+    first, second, third = _sample_bibs(3)
+    fh_out.write_bytes(first.as_marc())
+    with pytest.raises(RuntimeError):
+        with MarcBatchWriter(str(fh_out), chunk_size=1) as writer:
+            writer.write(second)
+            writer.write(third)
+            raise RuntimeError
+    assert fh_out.read_bytes() == first.as_marc()
+    assert [p.name for p in tmp_path.iterdir()] == ["foo.mrc"]
+
+
+@pytest.mark.parametrize("arg", [0, -1])
+def test_marc_batch_writer_invalid_chunk_size(arg):
+    with pytest.raises(ValueError):
+        MarcBatchWriter("foo.mrc", chunk_size=arg)
+
+
+def _strip_t005(data):
+    bibs = []
+    for bib in MARCReader(data):
+        bib.remove_fields("005")
+        bibs.append(bib.as_marc())
+    return bibs
+
+
+def test_generate_bibs_parallel():
+    items = [
+        Item(
+            status="for processing",
+            t245=f"Foo {n}",
+            t246="Bar",
+            t028="12345",
+            t520="spam spam spam",
+            t690="Power tools,Garden tools",
+            t500="some note",
+            t505="bar, shrubbery",
+            t856="https://example.com",
+            barcode=f"344440000000{n:02}",
+            cost="9.99",
+            loan_restriction="YES",
+        )
+        for n in range(10)
+    ]
+    serial = b"".join(
+        generate_bib(item, 24 + n).as_marc() for n, item in enumerate(items)
+    )
+    parallel = b"".join(generate_bibs_parallel(items, 24, workers=2, chunk_size=3))
+
+    assert _strip_t005(parallel) == _strip_t005(serial)
+
+    fast = b"".join(generate_bibs_parallel(items, 24, workers=2, fast_marc=True))
+    assert _strip_t005(fast) == _strip_t005(serial)
+
+    sequences = list(range(24, 34))
+    given = b"".join(generate_bibs_parallel(items, sequences, workers=2))
+    assert _strip_t005(given) == _strip_t005(serial)
+
+
+def test_generate_bib_fields_in_tag_order():
+    item = Item(
+        status="for processing",
+        t245="Foo",
+        t246="Bar; Spam",
+        t028="12345",
+        t520="spam spam spam",
+        t690="Power tools,Garden tools",
+        t500="some note",
+        t505="bar, shrubbery",
+        t856="https://example.com",
+        barcode="34444000000000;34444000000001",
+        cost="9.99",
+        loan_restriction="NO",
+    )
+    bib = generate_bib(item, 24, BibTemplate())
+    tags = [f.tag for f in bib.fields]
+    assert tags == sorted(tags)
+
+    expected = Record()
+    expected.leader = "00000nrm a2200000M  4500"
+    for field in bib.fields:
+        expected.add_ordered_field(field)
+    assert bib.as_marc() == expected.as_marc()
+
+
+def test_generate_bib_shared_template():
+    item = Item(
+        status="for processing",
+        t245="Foo",
+        t246="",
+        t028="",
+        t520="",
+        t690="Power tools",
+        t500="",
+        t505="",
+        t856="",
+        barcode="34444000000000",
+        cost="9.99",
+        loan_restriction="NO",
+    )
+    template = BibTemplate()
+    first = generate_bib(item, 1, template)
+    second = generate_bib(item, 2, template)
+    assert first["099"] is second["099"]
+    assert _strip_t005(first.as_marc()) != _strip_t005(second.as_marc())
+    assert _strip_t005(generate_bib(item, 1).as_marc()) == _strip_t005(first.as_marc())
+
+
+class _CountingField(Field):
+    created = 0
+
+    def __init__(self, *args, **kwargs):
+        _CountingField.created += 1
+        super().__init__(*args, **kwargs)
+
+
+class _CountingSubfield(Subfield):
+    created = 0
+
+    def __new__(cls, *args, **kwargs):
+        _CountingSubfield.created += 1
+        return super().__new__(cls, *args, **kwargs)
+
+
+def test_generate_bib_field_allocations(monkeypatch):
+    item = Item(
+        status="for processing",
+        t245="Foo",
+        t246="",
+        t028="12345",
+        t520="spam spam spam",
+        t690="Power tools,Garden tools",
+        t500="some note",
+        t505="bar, shrubbery",
+        t856="https://example.com",
+        barcode="34444000000000;34444000000001",
+        cost="9.99",
+        loan_restriction="NO",
+    )
+    template = BibTemplate()
+    clear_field_cache()
+    generate_bib(item, 23, template)  # warm up memoized subjects & urls
+    monkeypatch.setattr("src.producer.Field", _CountingField)
+    monkeypatch.setattr("src.producer.Subfield", _CountingSubfield)
+    monkeypatch.setattr(_CountingField, "created", 0)
+    monkeypatch.setattr(_CountingSubfield, "created", 0)
+
+    tracemalloc.start()
+    try:
+        bib = generate_bib(item, 24, template)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # one of each: 001, 005, 028, 245, 500, 505, 520, 856; two 690s & 960s,
+    # memoized 690 & 856 fields are copied reusing their subfields
+    assert _CountingField.created == 12
+    assert _CountingSubfield.created == 19
+    assert len(bib.fields) == 12 + 9
+    assert peak < 32 * 1024
+
+
+def test_generate_bib_memoized_fields():
+    item = Item(
+        status="for processing",
+        t245="Foo",
+        t246="",
+        t028="",
+        t520="",
+        t690="Power tools,Garden tools",
+        t500="",
+        t505="",
+        t856="https://example.com",
+        barcode="34444000000000",
+        cost="9.99",
+        loan_restriction="NO",
+    )
+    template = BibTemplate()
+    clear_field_cache()
+    first = generate_bib(item, 1, template)
+    second = generate_bib(item, 2, template)
+
+    info = field_cache_info()
+    assert (info["690"].hits, info["690"].misses) == (2, 2)
+    assert (info["856"].hits, info["856"].misses) == (1, 1)
+
+    # subjects are memoized individually, not per cell
+    generate_bib(item._replace(t690="Garden tools, Power tools"), 3, template)
+    assert field_cache_info()["690"].misses == 2
+
+    for tag in ("690", "856"):
+        a, b = first.get_fields(tag)[0], second.get_fields(tag)[0]
+        assert a is not b
+        assert a.subfields is not b.subfields
+        assert str(a) == str(b)
+
+    first["690"].add_subfield("x", "Foo")
+    assert str(second.get_fields("690")[0]) == "=690  \\4$aPower tools."
+
+    clear_field_cache()
+    assert field_cache_info()["690"].currsize == 0
+
+
+def test_generate_bib_memoized_invalid_value():
+    item = Item(
+        status="for processing",
+        t245="Foo",
+        t246="",
+        t028="",
+        t520="",
+        t690="",
+        t500="",
+        t505="",
+        t856="",
+        barcode="34444000000000",
+        cost="9.99",
+        loan_restriction="NO",
+    )
+    for _ in range(2):
+        with pytest.raises(Warning):
+            generate_bib(item, 1)
+
+
+def test_marc_batch_writer_bytes_written(tmp_path):
+    fh_out = tmp_path / "foo.mrc"
+    first, second = _sample_bibs(2)
+    fh_out.write_bytes(first.as_marc())
+    with MarcBatchWriter(str(fh_out)) as writer:
+        writer.write(second)
+    assert writer.bytes_written == len(second.as_marc())
+
+
+def test_marc_batch_writer_checkpoints_and_resumes(tmp_path):
+    fh_out = tmp_path / "foo.mrc"
+    bibs = _sample_bibs(3)
+    offsets = []
+    with pytest.raises(RuntimeError):
+        with MarcBatchWriter(
+            str(fh_out), chunk_size=2, on_flush=offsets.append
+        ) as writer:
+            for bib in bibs:
+                writer.write(bib)
+            raise RuntimeError
+    tmp = writer.tmp_path
+    assert not fh_out.exists()
+    assert offsets == [len(bibs[0].as_marc() + bibs[1].as_marc())]
+
+    # simulate a partially written record at the end of the temporary file
+    with open(tmp, "ab") as f:
+        f.write(bibs[2].as_marc()[:10])
+
+    with MarcBatchWriter(str(fh_out), tmp_path=tmp, offset=offsets[0]) as writer:
+        writer.write(bibs[2])
+    assert fh_out.read_bytes() == b"".join(b.as_marc() for b in bibs)
+    assert [p.name for p in tmp_path.iterdir()] == ["foo.mrc"]
+
+
+def test_bib_template_lookups():
+    template = BibTemplate()
+    assert template.price("9") == "9.00"
+    assert template.price("9") == "9.00"
+    with pytest.raises(ValueError):
+        template.price("$9")
+    assert template.item_type_code("yes") == "58"
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        assert template.item_type_code("maybe") == "59"
+        assert template.item_type_code("maybe") == "59"
+        assert template.item_type_code("") == "59"
+    assert template.invalid_loan_restrictions == {"maybe": 2, "": 1}
+
+
+def test_generate_bib_warns_without_template():
+    item = Item(
+        status="for processing",
+        t245="Foo",
+        t246="",
+        t028="",
+        t520="",
+        t690="Power tools",
+        t500="",
+        t505="",
+        t856="",
+        barcode="34444000000000",
+        cost="9.99",
+        loan_restriction="maybe",
+    )
+    with pytest.warns(UserWarning, match="Invalid loan restrition value"):
+        bib = generate_bib(item, 1)
+    assert bib["960"]["t"] == "59"
+
+    template = BibTemplate()
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        generate_bib(item, 2, template)
+    assert template.invalid_loan_restrictions == {"maybe": 1}
@@ -1,3 +1,8 @@
+import pickle
+
+import pytest
+
+from src.downloader import COL_NAMES
 from src.reader import read_data, Item
 
 
@@ -5,3 +10,90 @@ def test_read_data():
     reader = read_data()
     for item in reader:
         assert isinstance(item, Item)
+
+
+def _row(status, t245):
+    return [status, t245] + [""] * 10
+
+
+def test_read_data_status_filter(write_sheet):
+    write_sheet([_row("completed", "Foo"), _row("for processing", "Bar")])
+    items = list(read_data(status="for processing"))
+    assert len(items) == 1
+    assert isinstance(items[0], Item)
+    assert items[0].t245 == "Bar"
+
+
+def test_read_data_fields(write_sheet):
+    write_sheet([_row("completed", "Foo")])
+    item = next(read_data(fields=("t245", "status")))
+    assert item._fields == ("t245", "status")
+    assert tuple(item) == ("Foo", "completed")
+
+    item = next(read_data(fields=("t245",)))
+    assert item._fields == ("t245",)
+    assert item.t245 == "Foo"
+
+
+def test_read_data_numbered(write_sheet):
+    write_sheet(
+        [
+            _row("completed", "Foo"),
+            _row("for processing", "Bar"),
+            _row("for processing", "Spam"),
+        ]
+    )
+    rows = [
+        (row, item.t245)
+        for row, item in read_data(status="for processing", numbered=True)
+    ]
+    assert rows == [(3, "Bar"), (4, "Spam")]
+
+
+def test_item_api():
+    values = [f"value {n}" for n in range(12)]
+    item = Item._make(values)
+    assert item == Item(*values)
+    assert list(item) == values
+    assert item._fields == tuple(COL_NAMES)
+    assert item._asdict()["barcode"] == "value 9"
+    assert item.loan_restriction == "value 11"
+    assert not hasattr(item, "__dict__")
+    assert pickle.loads(pickle.dumps(item)) == item
+    assert hash(item) == hash(Item(*values))
+    assert len({item, Item(*values)}) == 1
+    assert repr(item).startswith("Item(status='value 0', t245='value 1'")
+    assert len(item) == 12
+    assert item[1] == "value 1"
+    assert item[-2:] == ("value 10", "value 11")
+    assert item._replace(t245="Foo") == Item(*values[:1], "Foo", *values[2:])
+    with pytest.raises(ValueError):
+        item._replace(title="Foo")
+
+
+def test_item_is_immutable():
+    item = Item._make([f"value {n}" for n in range(12)])
+    items = {item}
+    with pytest.raises(AttributeError):
+        item.t245 = "Foo"
+    with pytest.raises(AttributeError):
+        del item.t245
+    assert item.t245 == "value 1"
+    assert item in items
+
+
+def test_item_interns_low_cardinality_values():
+    first = Item._make(["".join(["com", "pleted"])] + ["".join(["x", "y"])] * 11)
+    second = Item._make(["".join(["comp", "leted"])] + ["".join(["x", "y"])] * 11)
+    for name in ("status", "t690", "cost", "loan_restriction"):
+        assert getattr(first, name) is getattr(second, name)
+    assert first.t245 is not second.t245
+
+
+def test_read_data_returns_rows_read(write_sheet):
+    write_sheet([_row("completed", "Foo"), _row("for processing", "Bar")])
+    reader = read_data(status="for processing")
+    assert next(reader).t245 == "Bar"
+    with pytest.raises(StopIteration) as exc:
+        next(reader)
+    assert exc.value.value == 2
@@ -0,0 +1,82 @@
+import json
+
+from src.stats import PipelineStats
+
+
+def _rows():
+    yield "foo"
+    yield "bar"
+    return 5
+
+
+def test_stage():
+    stats = PipelineStats("create")
+    for _ in range(2):
+        with stats.stage("download"):
+            pass
+    stats.add_time("write", 0.5)
+    stats.add_time("write", 0.25)
+    assert list(stats.stages) == ["download", "write"]
+    assert stats.stages["download"] > 0
+    assert stats.stages["write"] == 0.75
+
+
+def test_timed():
+    stats = PipelineStats("create")
+    assert list(stats.timed("parse", _rows(), result_counter="rows_seen")) == [
+        "foo",
+        "bar",
+    ]
+    assert stats.stages["parse"] > 0
+    assert stats.counters == {"rows_seen": 5}
+
+
+def test_timed_without_result():
+    stats = PipelineStats("create")
+    assert list(stats.timed("parse", ["foo"], result_counter="rows_seen")) == ["foo"]
+    assert stats.counters == {}
+
+
+def test_summary():
+    stats = PipelineStats("create")
+    stats.add_time("generate", 1.5)
+    stats.count("rows_processed", 3000)
+    stats.marks["first_record"] = 0.25
+    stats.elapsed = 2.0
+    assert stats.records_per_sec == 1500.0
+    assert stats.summary() == (
+        "Stage         Time (s)   Share\n"
+        "generate         1.500   75.0%\n"
+        "total            2.000\n"
+        "\n"
+        "Rows processed           3,000\n"
+        "Records/sec            1,500.0\n"
+        "First record (s)         0.250"
+    )
+
+
+def test_save(tmp_path):
+    fh_out = tmp_path / "stats.jsonl"
+    stats = PipelineStats("create")
+    stats.add_time("write", 0.1)
+    stats.count("bytes_written", 1024)
+    stats.finish()
+    stats.save(str(fh_out))
+    stats.save(str(fh_out))
+
+    lines = fh_out.read_text().splitlines()
+    assert len(lines) == 2
+    data = json.loads(lines[0])
+    assert data["command"] == "create"
+    assert data["stages"] == {"write": 0.1}
+    assert data["counters"] == {"bytes_written": 1024}
+    assert data["elapsed"] > 0
+
+
+def test_mark():
+    stats = PipelineStats("create")
+    stats.mark("first_record")
+    first = stats.marks["first_record"]
+    stats.mark("first_record")
+    assert stats.marks == {"first_record": first}
+    assert stats.as_dict()["marks"] == {"first_record": round(first, 6)}
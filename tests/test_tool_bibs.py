@@ -0,0 +1,667 @@
+import csv
+import json
+import os
+import subprocess
+import sys
+from functools import partial
+
+import pytest
+from pymarc import parse_xml_to_array
+
+from src.checkpoint import load_checkpoint
+from src.marc_scan import control_field, iter_records
+from tests.conftest import make_item
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# total self import time allowed for `python tool_bibs.py --help`
+IMPORT_BUDGET_US = 100_000
+
+HEAVY_MODULES = [
+    "pymarc",
+    "sqlite3",
+    "csv",
+    "urllib.request",
+    "concurrent.futures",
+    "src.producer",
+    "src.downloader",
+]
+
+
+def _import_times(*args):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "tool_bibs.py", *args],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, module = line[len("import time:") :].split("|")
+        times[module.strip()] = int(self_us)
+    return result, times
+
+
+def test_help_import_time():
+    result, times = _import_times("--help")
+    assert result.returncode == 0
+    assert "create" in result.stdout
+    assert "argparse" in times
+    for module in HEAVY_MODULES:
+        assert module not in times
+    assert sum(times.values()) < IMPORT_BUDGET_US
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        [],
+        ["foo"],
+        ["create", "x"],
+        ["create", "24", "--resume"],
+        ["create", "24", "--workers", "0"],
+        ["create", "--discard", "--resume"],
+        ["create", "24", "--discard"],
+    ],
+)
+def test_invalid_arguments(args):
+    result, times = _import_times(*args)
+    assert result.returncode == 2
+    assert "usage: tool_bibs.py" in result.stderr
+    for module in HEAVY_MODULES:
+        assert module not in times
+
+
+def _sheet_row(n, **kwargs):
+    values = dict(t245=f"Foo {n}", barcode=f"344440000000{n:02}")
+    values.update(kwargs)
+    return list(make_item(**values))
+
+
+def _control_numbers(path):
+    from src.marc_scan import control_field, iter_records
+
+    with open(path, "rb") as fh:
+        return [control_field(record, "001") for _, record in iter_records(fh)]
+
+
+def test_create_resume(write_sheet, monkeypatch, capfd):
+    import tool_bibs
+    from src import producer
+
+    monkeypatch.setattr(producer, "_date_today", lambda: "240101")
+    monkeypatch.setattr(
+        producer, "MarcBatchWriter", partial(producer.MarcBatchWriter, chunk_size=2)
+    )
+    rows = [_sheet_row(n) for n in range(5)]
+    rows[3] = _sheet_row(3, t245="")
+    write_sheet(rows)
+
+    tool_bibs.main(["create", "24", "--offline"])
+    assert "Run interrupted" in capfd.readouterr().out
+    assert not os.path.exists("out/tool-bibs-240101.mrc")
+    checkpoint = load_checkpoint()
+    assert (checkpoint["row"], checkpoint["sequence"]) == (3, 26)
+
+    tool_bibs.main(["create", "24", "--offline"])
+    assert "Found interrupted run" in capfd.readouterr().out
+
+    rows[3] = _sheet_row(3)
+    write_sheet(rows)
+    tool_bibs.main(["create", "--resume", "--offline"])
+    assert "Created 5 bibs." in capfd.readouterr().out
+    assert load_checkpoint() is None
+    assert _control_numbers("out/tool-bibs-240101.mrc") == [
+        f"bkl-tll-00000{n}" for n in range(24, 29)
+    ]
+    assert sorted(os.listdir("out")) == [
+        "barcodes.db",
+        "create.lock",
+        "fingerprints.db",
+        "metadata.csv",
+        "sequence.db",
+        "stats.jsonl",
+        "tool-bibs-240101.mrc",
+    ]
+
+
+def test_create_resume_rejects_edited_rows(write_sheet, monkeypatch, capfd):
+    import tool_bibs
+    from src import producer
+
+    monkeypatch.setattr(producer, "_date_today", lambda: "240101")
+    monkeypatch.setattr(
+        producer, "MarcBatchWriter", partial(producer.MarcBatchWriter, chunk_size=2)
+    )
+    rows = [_sheet_row(n) for n in range(5)]
+    rows[3] = _sheet_row(3, t245="")
+    write_sheet(rows)
+    tool_bibs.main(["create", "24", "--offline"])
+    assert "Run interrupted" in capfd.readouterr().out
+
+    # the batch holds the original title of a row written before
+    rows[1] = _sheet_row(1, t245="Foo 1 edited")
+    rows[3] = _sheet_row(3)
+    write_sheet(rows)
+    tool_bibs.main(["create", "--resume", "--offline"])
+    assert (
+        "Rows marked for processing changed since the interrupted run"
+        in capfd.readouterr().out
+    )
+    assert load_checkpoint() is not None
+    assert not os.path.exists("out/fingerprints.db")
+
+
+def test_create_resume_quarantine(write_sheet, monkeypatch, capfd):
+    import tool_bibs
+    from src import producer
+
+    monkeypatch.setattr(producer, "_date_today", lambda: "240101")
+    monkeypatch.setattr(
+        producer, "MarcBatchWriter", partial(producer.MarcBatchWriter, chunk_size=2)
+    )
+    generate_bib = producer.generate_bib
+
+    def interrupted(item, *args):
+        if item.t245 == "Foo 3":
+            raise KeyboardInterrupt
+        return generate_bib(item, *args)
+
+    monkeypatch.setattr(producer, "generate_bib", interrupted)
+    rows = [_sheet_row(n) for n in range(5)]
+    rows[1] = _sheet_row(1, t245="")
+    write_sheet(rows)
+
+    with pytest.raises(KeyboardInterrupt):
+        tool_bibs.main(["create", "24", "--offline", "--on-error=quarantine"])
+    assert "Run interrupted" in capfd.readouterr().out
+
+    monkeypatch.setattr(producer, "generate_bib", generate_bib)
+    tool_bibs.main(["create", "--resume", "--offline"])
+    out = capfd.readouterr().out
+    assert "Created 4 bibs." in out
+    assert "Rejected 1 invalid rows" in out
+    assert _control_numbers("out/tool-bibs-240101.mrc") == [
+        f"bkl-tll-00000{n}" for n in range(24, 28)
+    ]
+
+
+def test_create_holds_run_lock(write_sheet, capfd):
+    import tool_bibs
+    from src.checkpoint import run_lock
+
+    write_sheet([_sheet_row(0)])
+    with run_lock():
+        tool_bibs.main(["create", "24", "--offline"])
+    assert "Another create run is in progress" in capfd.readouterr().out
+    assert sorted(os.listdir("out")) == ["create.lock", "metadata.csv"]
+
+    tool_bibs.main(["create", "24", "--offline"])
+    assert "Created 1 bibs." in capfd.readouterr().out
+
+
+def test_create_resume_without_checkpoint(write_sheet, capfd):
+    import tool_bibs
+
+    write_sheet([_sheet_row(0)])
+    tool_bibs.main(["create", "--resume", "--offline"])
+    assert "No interrupted run to resume" in capfd.readouterr().out
+
+
+def test_create_then_verify_reports_duplicate_barcode(write_sheet, capfd):
+    import tool_bibs
+
+    rows = [_sheet_row(0, status="completed")]
+    write_sheet(rows)
+    tool_bibs.main(["verify", "--offline"])
+    assert "Success!" in capfd.readouterr().out
+
+    rows.append(_sheet_row(1, barcode=rows[0][9]))
+    write_sheet(rows)
+    tool_bibs.main(["create", "24", "--offline"])
+    assert (
+        f"Warning, barcode {rows[0][9]} of row 3 is already used by another row"
+        in capfd.readouterr().out
+    )
+
+    for _ in range(2):
+        tool_bibs.main(["verify", "--offline"])
+        assert capfd.readouterr().out == (
+            f"Found duplicate barcode: {rows[0][9]} for Foo 1\n"
+        )
+
+
+@pytest.mark.parametrize("args", [[], ["--workers", "2"], ["--fast-marc"]])
+def test_create_on_error_quarantine(write_sheet, monkeypatch, capfd, args):
+    import tool_bibs
+    from src import producer
+
+    monkeypatch.setattr(producer, "_date_today", lambda: "240101")
+    rows = [_sheet_row(n) for n in range(5)]
+    rows[1] = _sheet_row(1, t245="", cost="$9")
+    rows[3] = _sheet_row(3, barcode="14444000000003")
+    write_sheet(rows)
+
+    tool_bibs.main(["create", "24", "--offline", "--on-error=quarantine", *args])
+    out = capfd.readouterr().out
+    assert "Created 3 bibs." in out
+    assert "Rejected 2 invalid rows, see out/rejects-240101.csv." in out
+    assert _control_numbers("out/tool-bibs-240101.mrc") == [
+        f"bkl-tll-00000{n}" for n in range(24, 27)
+    ]
+    with open("out/rejects-240101.csv", newline="") as csvfile:
+        rejects = list(csv.reader(csvfile))
+    assert rejects[0][:3] == ["row", "errors", "status"]
+    assert [r[:2] for r in rejects[1:]] == [
+        ["3", "Missing title. Invalid cost: '$9'"],
+        ["5", "Invalid barcode: 14444000000003"],
+    ]
+    assert rejects[1][2:] == rows[1]
+
+
+def test_create_on_error_abort(write_sheet, monkeypatch, capfd):
+    import tool_bibs
+    from src import producer
+
+    monkeypatch.setattr(producer, "_date_today", lambda: "240101")
+    write_sheet([_sheet_row(0, t245="")])
+    tool_bibs.main(["create", "24", "--offline"])
+    assert "A error occurred" in capfd.readouterr().out
+    assert not os.path.exists("out/rejects-240101.csv")
+
+
+@pytest.mark.parametrize("args", [[], ["--workers", "2"], ["--fast-marc"]])
+def test_create_invalid_loan_restriction_summary(write_sheet, capfd, args):
+    import warnings
+
+    import tool_bibs
+
+    rows = [_sheet_row(n, loan_restriction="maybe") for n in range(3)]
+    rows[1] = _sheet_row(1, loan_restriction="")
+    write_sheet(rows + [_sheet_row(3)])
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        tool_bibs.main(["create", "24", "--offline", *args])
+    assert (
+        "Warning, invalid loan restriction value in 3 rows ('maybe' x2, '' x1), "
+        "items will not be restricted."
+    ) in capfd.readouterr().out
+
+
+def test_create_pipelined(write_sheet, monkeypatch, capfd):
+    import tool_bibs
+    from src import producer
+
+    monkeypatch.setattr(producer, "_date_today", lambda: "240101")
+    write_sheet([_sheet_row(n) for n in range(5)])
+    tool_bibs.main(["create", "24", "--offline", "--pipelined", "--stats"])
+    out = capfd.readouterr().out
+    assert "Created 5 bibs." in out
+    assert "First record (s)" in out
+    assert _control_numbers("out/tool-bibs-240101.mrc") == [
+        f"bkl-tll-00000{n}" for n in range(24, 29)
+    ]
+
+
+@pytest.mark.parametrize(
+    "args", [[], ["--workers", "2"], ["--fast-marc"], ["--pipelined"]]
+)
+def test_create_format_all(write_sheet, monkeypatch, capfd, args):
+    import json
+
+    from pymarc import parse_xml_to_array
+
+    import tool_bibs
+    from src import producer
+
+    monkeypatch.setattr(producer, "_date_today", lambda: "240101")
+    write_sheet([_sheet_row(n) for n in range(3)])
+    tool_bibs.main(["create", "24", "--offline", "--format", "all", *args])
+    out = capfd.readouterr().out
+    assert "Wrote 3 records to out/tool-bibs-240101.xml." in out
+    assert "Wrote 3 records to out/tool-bibs-240101.jsonl." in out
+    control_nos = _control_numbers("out/tool-bibs-240101.mrc")
+    assert len(control_nos) == 3
+    bibs = parse_xml_to_array("out/tool-bibs-240101.xml")
+    assert [bib["001"].data for bib in bibs] == control_nos
+    with open("out/tool-bibs-240101.jsonl", encoding="utf-8") as jsonfile:
+        bibs = [json.loads(line) for line in jsonfile]
+    assert [bib["fields"][0]["001"] for bib in bibs] == control_nos
+
+
+def test_create_format_resume(write_sheet, monkeypatch, capfd):
+    import json
+
+    import tool_bibs
+    from src import producer
+
+    monkeypatch.setattr(producer, "_date_today", lambda: "240101")
+    monkeypatch.setattr(
+        producer, "MarcBatchWriter", partial(producer.MarcBatchWriter, chunk_size=2)
+    )
+    rows = [_sheet_row(n) for n in range(5)]
+    rows[3] = _sheet_row(3, t245="")
+    write_sheet(rows)
+
+    tool_bibs.main(["create", "24", "--offline", "--format", "json"])
+    assert "Run interrupted" in capfd.readouterr().out
+    assert not os.path.exists("out/tool-bibs-240101.jsonl")
+
+    rows[3] = _sheet_row(3)
+    write_sheet(rows)
+    tool_bibs.main(["create", "--resume", "--offline"])
+    assert "Wrote 5 records to out/tool-bibs-240101.jsonl." in capfd.readouterr().out
+    with open("out/tool-bibs-240101.jsonl", encoding="utf-8") as jsonfile:
+        bibs = [json.loads(line) for line in jsonfile]
+    assert [bib["fields"][0]["001"] for bib in bibs] == [
+        f"bkl-tll-00000{n}" for n in range(24, 29)
+    ]
+    # records written before the interruption are fed as they were written
+    with open("out/tool-bibs-240101.mrc", "rb") as batch:
+        timestamps = [control_field(data, "005") for _, data in iter_records(batch)]
+    fields = [{k: v for f in bib["fields"] for k, v in f.items()} for bib in bibs]
+    assert [field["005"] for field in fields] == timestamps
+
+
+def test_create_allocates_control_numbers(write_sheet, monkeypatch, capfd):
+    import tool_bibs
+    from src import producer
+
+    monkeypatch.setattr(producer, "_date_today", lambda: "240101")
+    write_sheet([_sheet_row(n) for n in range(3)])
+    tool_bibs.main(["create", "24", "--offline"])
+    assert "Control #s: bkl-tll-0000024 - bkl-tll-0000026" in capfd.readouterr().out
+
+    monkeypatch.setattr(producer, "_date_today", lambda: "240102")
+    tool_bibs.main(["create", "--offline"])
+    assert "Control #s: bkl-tll-0000027 - bkl-tll-0000029" in capfd.readouterr().out
+    assert _control_numbers("out/tool-bibs-240102.mrc") == [
+        f"bkl-tll-00000{n}" for n in range(27, 30)
+    ]
+
+    tool_bibs.main(["create", "25", "--offline"])
+    assert (
+        "Control # sequence 25 is already used or reserved, next free one is 30"
+        in capfd.readouterr().out
+    )
+
+
+def test_create_requires_start_sequence_of_first_run(write_sheet, capfd):
+    import tool_bibs
+
+    write_sheet([_sheet_row(0)])
+    tool_bibs.main(["create", "--offline"])
+    assert "give the starting sequence explicitly" in capfd.readouterr().out
+    assert not os.path.exists("out/checkpoint.json")
+
+
+def test_create_releases_control_numbers_of_failed_start(
+    write_sheet, monkeypatch, capfd
+):
+    import tool_bibs
+    from src import producer
+
+    monkeypatch.setattr(producer, "_date_today", lambda: "240101")
+    write_sheet([_sheet_row(0)])
+    tool_bibs.main(["create", "24", "--offline"])
+    os.remove("out/metadata.csv")
+    tool_bibs.main(["create", "--offline"])
+    out = capfd.readouterr().out
+    assert "A error occurred" in out
+    assert "Run interrupted" not in out
+
+    write_sheet([_sheet_row(1)])
+    tool_bibs.main(["create", "--offline"])
+    assert "Control #s: bkl-tll-0000025 - bkl-tll-0000025" in capfd.readouterr().out
+    assert sorted(os.listdir("out")) == [
+        "barcodes.db",
+        "create.lock",
+        "fingerprints.db",
+        "metadata.csv",
+        "sequence.db",
+        "stats.jsonl",
+        "tool-bibs-240101.mrc",
+    ]
+
+
+def test_create_releases_control_numbers_of_failed_first_row(
+    write_sheet, monkeypatch, capfd
+):
+    import tool_bibs
+    from src import producer
+
+    monkeypatch.setattr(producer, "_date_today", lambda: "240101")
+    rows = [_sheet_row(n) for n in range(3)]
+    write_sheet(rows)
+    tool_bibs.main(["create", "24", "--offline"])
+    capfd.readouterr()
+
+    monkeypatch.setattr(producer, "_date_today", lambda: "240102")
+    write_sheet([_sheet_row(3, t245=""), _sheet_row(4)])
+    tool_bibs.main(["create", "--offline"])
+    out = capfd.readouterr().out
+    assert "A error occurred" in out
+    assert "Run interrupted" not in out
+    assert not os.path.exists("out/checkpoint.json")
+    assert not [name for name in os.listdir("out") if name.endswith(".tmp")]
+
+    write_sheet([_sheet_row(3), _sheet_row(4)])
+    tool_bibs.main(["create", "--offline"])
+    assert "Control #s: bkl-tll-0000027 - bkl-tll-0000028" in capfd.readouterr().out
+
+
+def test_create_discard(write_sheet, monkeypatch, capfd):
+    import tool_bibs
+    from src import producer
+
+    monkeypatch.setattr(producer, "_date_today", lambda: "240101")
+    monkeypatch.setattr(
+        producer, "MarcBatchWriter", partial(producer.MarcBatchWriter, chunk_size=2)
+    )
+    tool_bibs.main(["create", "--discard"])
+    assert "No interrupted run to discard" in capfd.readouterr().out
+
+    rows = [_sheet_row(n) for n in range(5)]
+    rows[3] = _sheet_row(3, t245="")
+    write_sheet(rows)
+    tool_bibs.main(["create", "24", "--offline"])
+    assert "create --discard" in capfd.readouterr().out
+    assert load_checkpoint()["sequence"] == 26
+
+    tool_bibs.main(["create", "--discard"])
+    assert (
+        "Discarded interrupted run of out/tool-bibs-240101.mrc."
+        in capfd.readouterr().out
+    )
+    assert sorted(os.listdir("out")) == ["create.lock", "metadata.csv", "sequence.db"]
+
+    # control #s of records written to the dropped batch are not reused
+    rows[3] = _sheet_row(3)
+    write_sheet(rows)
+    tool_bibs.main(["create", "--offline"])
+    assert "Control #s: bkl-tll-0000026 - bkl-tll-0000030" in capfd.readouterr().out
+
+
+def test_create_releases_control_numbers_of_bad_feed(write_sheet, monkeypatch, capfd):
+    import tool_bibs
+    from src import producer
+
+    monkeypatch.setattr(producer, "_date_today", lambda: "240101")
+    write_sheet([_sheet_row(0)])
+    tool_bibs.main(["create", "24", "--offline"])
+    with open("out/tool-bibs-240101.xml", "w") as xmlfile:
+        xmlfile.write("<records/>")
+    tool_bibs.main(["create", "--offline", "--format", "xml"])
+    assert "is not a MARCXML collection" in capfd.readouterr().out
+    assert not os.path.exists("out/checkpoint.json")
+    assert not [name for name in os.listdir("out") if name.endswith(".tmp")]
+
+    tool_bibs.main(["create", "--offline"])
+    assert "Control #s: bkl-tll-0000025 - bkl-tll-0000025" in capfd.readouterr().out
+
+
+@pytest.mark.parametrize("args", [[], ["--workers", "2"], ["--fast-marc"]])
+def test_create_changed_only(write_sheet, monkeypatch, capfd, args):
+    import tool_bibs
+    from src import producer
+
+    monkeypatch.setattr(producer, "_date_today", lambda: "240101")
+    rows = [_sheet_row(n) for n in range(3)]
+    write_sheet(rows)
+    tool_bibs.main(["create", "24", "--offline"])
+    capfd.readouterr()
+
+    monkeypatch.setattr(producer, "_date_today", lambda: "240102")
+    rows[1] = _sheet_row(1, t245="Foo 1 edited")
+    write_sheet(rows + [_sheet_row(3)])
+    tool_bibs.main(["create", "--offline", "--changed-only", "--format", "all", *args])
+    out = capfd.readouterr().out
+    assert "Created 1 bibs." in out
+    assert "Skipped 2 unchanged rows." in out
+    assert (
+        "Re-emitted 1 edited rows as overlays to out/tool-bibs-240102-overlay.mrc."
+        in out
+    )
+    assert _control_numbers("out/tool-bibs-240102.mrc") == ["bkl-tll-0000027"]
+    assert _control_numbers("out/tool-bibs-240102-overlay.mrc") == ["bkl-tll-0000025"]
+    bibs = parse_xml_to_array("out/tool-bibs-240102-overlay.xml")
+    assert [bib["001"].data for bib in bibs] == ["bkl-tll-0000025"]
+    with open("out/tool-bibs-240102-overlay.jsonl", encoding="utf-8") as jsonfile:
+        bibs = [json.loads(line) for line in jsonfile]
+    assert [bib["fields"][0]["001"] for bib in bibs] == ["bkl-tll-0000025"]
+
+    # edits are recorded, so nothing is left to emit on the next run
+    tool_bibs.main(["create", "--offline", "--changed-only"])
+    out = capfd.readouterr().out
+    assert "Created 0 bibs." in out
+    assert "Skipped 4 unchanged rows." in out
+
+
+def test_create_changed_only_resume(write_sheet, monkeypatch, capfd):
+    import tool_bibs
+    from src import producer
+
+    monkeypatch.setattr(producer, "_date_today", lambda: "240101")
+    monkeypatch.setattr(
+        producer, "MarcBatchWriter", partial(producer.MarcBatchWriter, chunk_size=1)
+    )
+    rows = [_sheet_row(n) for n in range(3)]
+    write_sheet(rows)
+    tool_bibs.main(["create", "24", "--offline"])
+    capfd.readouterr()
+
+    # unchanged rows follow the row the run is interrupted at
+    monkeypatch.setattr(producer, "_date_today", lambda: "240102")
+    new_rows = [_sheet_row(n) for n in range(3, 6)]
+    new_rows[1] = _sheet_row(4, t245="")
+    write_sheet(new_rows + rows)
+    tool_bibs.main(["create", "--offline", "--changed-only"])
+    assert "Run interrupted" in capfd.readouterr().out
+
+    new_rows[1] = _sheet_row(4)
+    write_sheet(new_rows + rows)
+    tool_bibs.main(["create", "--resume", "--offline"])
+    out = capfd.readouterr().out
+    assert "Created 3 bibs." in out
+    assert "Skipped 3 unchanged rows." in out
+    assert _control_numbers("out/tool-bibs-240102.mrc") == [
+        f"bkl-tll-00000{n}" for n in range(27, 30)
+    ]
+
+
+def test_create_changed_only_invalid_edit(write_sheet, monkeypatch, capfd):
+    import tool_bibs
+    from src import producer
+
+    monkeypatch.setattr(producer, "_date_today", lambda: "240101")
+    rows = [_sheet_row(n) for n in range(2)]
+    write_sheet(rows)
+    tool_bibs.main(["create", "24", "--offline"])
+    capfd.readouterr()
+
+    monkeypatch.setattr(producer, "_date_today", lambda: "240102")
+    rows[0] = _sheet_row(0, t245="")
+    write_sheet(rows + [_sheet_row(2)])
+    tool_bibs.main(["create", "--offline", "--changed-only"])
+    out = capfd.readouterr().out
+    assert "Edited row 2 is invalid: Missing title." in out
+    assert "Run interrupted" not in out
+    # nothing was written, so there is nothing to resume
+    assert sorted(os.listdir("out")) == [
+        "barcodes.db",
+        "create.lock",
+        "fingerprints.db",
+        "metadata.csv",
+        "sequence.db",
+        "stats.jsonl",
+        "tool-bibs-240101.mrc",
+    ]
+
+    tool_bibs.main(["create", "--offline", "--changed-only", "--on-error=quarantine"])
+    out = capfd.readouterr().out
+    assert "Created 1 bibs." in out
+    assert "Control #s: bkl-tll-0000026 - bkl-tll-0000026" in out
+    assert "Rejected 1 invalid rows" in out
+    assert not os.path.exists("out/tool-bibs-240102-overlay.mrc")
+
+
+def test_index_and_lookup(write_sheet, monkeypatch, capfd):
+    import tool_bibs
+    from src.marc_scan import iter_records
+    from src import producer
+
+    monkeypatch.setattr(producer, "_date_today", lambda: "240101")
+    write_sheet([_sheet_row(n) for n in range(3)])
+    tool_bibs.main(["create", "24", "--offline"])
+    tool_bibs.main(["index"])
+    assert "Indexed 3 records in 1 files (1 rescanned)." in capfd.readouterr().out
+
+    tool_bibs.main(["lookup", "bkl-tll-0000025"])
+    out = capfd.readouterr().out
+    assert out.startswith("out/tool-bibs-240101.mrc at offset ")
+    assert "=001  bkl-tll-0000025" in out
+    assert "=245  00$aFoo 1\n" in out
+
+    tool_bibs.main(["lookup", "34444000000002"])
+    assert "=001  bkl-tll-0000026" in capfd.readouterr().out
+
+    tool_bibs.main(["lookup", "bkl-tll-0000024", "--raw"])
+    with open("out/tool-bibs-240101.mrc", "rb") as fh:
+        first = next(iter_records(fh))[1]
+    assert capfd.readouterr().out == first.decode("utf-8")
+
+    tool_bibs.main(["lookup", "34444000000009"])
+    assert "No record found for 34444000000009" in capfd.readouterr().out
+
+
+def test_merge(write_sheet, monkeypatch, capfd):
+    import tool_bibs
+    from src import producer
+
+    monkeypatch.setattr(producer, "_date_today", lambda: "240101")
+    rows = [_sheet_row(n) for n in range(3)]
+    write_sheet(rows)
+    tool_bibs.main(["create", "24", "--offline"])
+
+    monkeypatch.setattr(producer, "_date_today", lambda: "240102")
+    rows[0] = _sheet_row(0, t245="Foo 0 edited")
+    write_sheet(rows)
+    tool_bibs.main(["create", "--offline", "--changed-only"])
+    capfd.readouterr()
+
+    tool_bibs.main(["merge"])
+    assert capfd.readouterr().out == (
+        "Merged 3 records from 2 files into out/merged-240102.mrc, dropped 1 "
+        "superseded records.\n"
+    )
+    assert sorted(_control_numbers("out/merged-240102.mrc")) == [
+        "bkl-tll-0000024",
+        "bkl-tll-0000025",
+        "bkl-tll-0000026",
+    ]
+
+    tool_bibs.main(["merge", "--output", "out/tool-bibs-240101.mrc"])
+    assert "is one of the merged batches" in capfd.readouterr().out
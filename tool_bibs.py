@@ -1,49 +1,702 @@
-import sys
+"""
+Command line interface of the crosswalk.
 
-from src.downloader import get_metadata
-from src.producer import save2marc, generate_bib, _date_today
-from src.reader import read_data
-from src.data_checker import verify_barcodes
+Each command imports the modules it needs when it runs, which keeps startup
+of `--help`, argument errors and light commands cheap.
+"""
 
+from __future__ import annotations
 
-def run(start_sequence: str) -> None:
+import argparse
+from collections.abc import Iterable, Iterator
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from src.checkpoint import Checkpoint, RunProgress
+    from src.feeds import _FeedWriter
+    from src.producer import BibTemplate
+    from src.reader import Item  # type: ignore
+    from src.stats import PipelineStats
+
+
+def run(
+    start_sequence: int | None = None,
+    workers: int = 1,
+    max_age: float | None = None,
+    offline: bool = False,
+    fast_marc: bool = False,
+    show_stats: bool = False,
+    resume: bool = False,
+    on_error: str = "abort",
+    pipelined: bool = False,
+    changed_only: bool = False,
+    formats: str = "marc",
+) -> None:
+    from src.checkpoint import RunOptions, resume_run, run_lock, start_run
+    from src.data_checker import save_rejects
+    from src.fingerprints import RowFingerprints
+    from src.producer import BibTemplate, _control_no, _date_today
+    from src.stats import PipelineStats
+
+    # a single run at a time, overlapping ones would clobber the batch
+    with run_lock():
+        if resume:
+            progress, saved = resume_run()
+        else:
+            progress = start_run(
+                f"out/tool-bibs-{_date_today()}.mrc",
+                start_sequence,
+                RunOptions(
+                    on_error=on_error, formats=formats, changed_only=changed_only
+                ),
+            )
+            saved = None
+        on_error = progress.checkpoint["on_error"]
+        formats = progress.checkpoint["formats"]
+        changed_only = progress.checkpoint["changed_only"]
+        start = progress.checkpoint["start"]
+        out = progress.checkpoint["out"]
+        stats = PipelineStats("create")
+        template = BibTemplate()
+        overlays: list[tuple[int, Item, str]] = []
+        rejects: list[tuple[int, Item, list[str]]] = []
+        # MARCXML and MARC-in-JSON feeds written in the same pass as the batch
+        feeds = _feed_writers(out, formats)
+
+        try:
+            rows: Iterable[tuple[int, Item]]
+            rows = _read_rows(pipelined, max_age, offline, stats)
+            if changed_only:
+                with RowFingerprints() as fingerprints:
+                    emitted = fingerprints.emitted()
+                rows = _changed_rows(rows, emitted, overlays, on_error, rejects, stats)
+            if on_error == "quarantine":
+                rows = _quarantine(rows, rejects, stats)
+            processed = []
+            if saved is not None:
+                # rows written before the interruption only need indexing
+                pending = list(rows)
+                processed = progress.replay(pending, saved)
+                rows = pending[len(processed) :]
+            processed += _write_batch(
+                rows,
+                progress,
+                saved,
+                list(processed),
+                template,
+                stats,
+                rejects,
+                workers=workers,
+                fast_marc=fast_marc,
+                pipelined=pipelined,
+                feeds=feeds,
+            )
+        except BaseException:
+            # a run which wrote nothing is dropped, giving back its control #s
+            if progress.interrupt():
+                print(
+                    "Run interrupted, continue it with "
+                    "`python tool_bibs.py create --resume` or drop it with "
+                    "`python tool_bibs.py create --discard`."
+                )
+            raise
+        progress.finish()
+        end = progress.sequence
+
+        # keep barcode index and row fingerprints in sync with created bibs
+        created = [(row, item, _control_no(seq)) for row, item, seq in processed]
+        with stats.stage("index"):
+            _record_bibs(created)
+
+        # re-emit rows edited since they were crosswalked under their control #s
+        if overlays:
+            overlays_out = f"out/tool-bibs-{_date_today()}-overlay.mrc"
+            with stats.stage("overlay"):
+                feeds += _write_overlays(
+                    overlays, overlays_out, template, workers, fast_marc, formats
+                )
+                _record_bibs(overlays)
+
+        invalid_loans = template.invalid_loan_restrictions
+
+        if rejects:
+            rejects_out = f"out/rejects-{_date_today()}.csv"
+            save_rejects(rejects, rejects_out)
+
+        stats.finish()
+        stats.count("rows_processed", len(processed))
+        stats.count("rows_rejected", len(rejects))
+        stats.count("rows_overlaid", len(overlays))
+        stats.save()
+
+        print("Completed...")
+        print(f"Created {end - start} bibs.")
+        if end > start:
+            print(f"Control #s: {_control_no(start)} - {_control_no(end - 1)}")
+        if invalid_loans:
+            values = ", ".join(f"{v!r} x{c}" for v, c in invalid_loans.items())
+            print(
+                f"Warning, invalid loan restriction value in "
+                f"{sum(invalid_loans.values())} rows ({values}), items will not be "
+                "restricted."
+            )
+        if changed_only:
+            print(f"Skipped {stats.counters.get('rows_unchanged', 0)} unchanged rows.")
+        if overlays:
+            print(
+                f"Re-emitted {len(overlays)} edited rows as overlays to {overlays_out}."
+            )
+        for feed in feeds:
+            print(f"Wrote {feed.records_written} records to {feed.fh_out}.")
+        if rejects:
+            print(f"Rejected {len(rejects)} invalid rows, see {rejects_out}.")
+        if show_stats:
+            print()
+            print(stats.summary())
+
+
+def discard() -> None:
+    from src.checkpoint import discard_run, load_checkpoint, run_lock
+
+    with run_lock():
+        checkpoint = load_checkpoint()
+        if checkpoint is None:
+            raise ValueError("No interrupted run to discard")
+        discard_run(checkpoint)
+    print(f"Discarded interrupted run of {checkpoint['out']}.")
+
+
+def _read_rows(
+    pipelined: bool, max_age: float | None, offline: bool, stats: PipelineStats
+) -> Iterator[tuple[int, Item]]:
+    """Returns numbered rows marked for processing of a fresh copy of the sheet"""
+    from src.downloader import get_metadata
+    from src.pipeline import stream_data
+    from src.reader import read_data  # type: ignore
+
+    if pipelined:
+        # rows are streamed while the local copy of metadata is refreshed
+        return stats.timed(
+            "fetch",
+            stream_data("for processing", max_age=max_age, offline=offline),
+            result_counter="rows_seen",
+        )
     # refresh local copy of metadata
-    get_metadata()
-    n = int(start_sequence)
+    with stats.stage("download"):
+        get_metadata(max_age=max_age, offline=offline)
+    return stats.timed(
+        "parse",
+        read_data(status="for processing", numbered=True),
+        result_counter="rows_seen",
+    )
+
+
+def _write_batch(
+    rows: Iterable[tuple[int, Item]],
+    progress: RunProgress,
+    saved: Checkpoint | None,
+    replayed: list[tuple[int, Item, int]],
+    template: BibTemplate,
+    stats: PipelineStats,
+    rejects: list[tuple[int, Item, list[str]]],
+    feeds: list[_FeedWriter],
+    workers: int = 1,
+    fast_marc: bool = False,
+    pipelined: bool = False,
+) -> list[tuple[int, Item, int]]:
+    """
+    Writes bibs of `rows` under control #s following `progress` to the batch
+    of the run and its feeds, checkpointing the batch as it goes. The batch
+    of an interrupted run is continued from its `saved` checkpoint, rows it
+    wrote are `replayed`. Returns written rows with their control #s.
+    """
+    from contextlib import ExitStack, nullcontext
+    from time import perf_counter
 
-    # determine output file
-    date = _date_today()
-    out = f"out/tool-bibs-{date}.mrc"
+    from src.marc_serializer import MarcSerializer
+    from src.pipeline import BackgroundWriter
+    from src.producer import MarcBatchWriter, generate_bib, generate_bibs_parallel
 
-    # loop over metadata, create bibs, and serialize to MARC21
-    for item in read_data():
-        if item.status == "for processing":
-            bib = generate_bib(item, n)
-            save2marc(bib, out)
-            n += 1
+    writer = MarcBatchWriter(
+        progress.checkpoint["out"],
+        on_flush=progress.save,
+        tmp_path=None if saved is None else saved["tmp"],
+        offset=0 if saved is None else saved["offset"],
+    )
+    background = (
+        BackgroundWriter(writer, before_write=lambda state: progress.advance(*state))
+        if pipelined
+        else None
+    )
 
-    print("Completed...")
-    print(f"Created {n-int(start_sequence)} bibs.")
+    def write(data: bytes, row: int, item: Item, sequence: int) -> None:
+        stats.mark("first_record")
+        for feed in feeds:
+            feed.write(data)
+        if background is not None:
+            background.write(data, (row, item, sequence))
+        else:
+            progress.advance(row, item, sequence)
+            writer.write(data)
 
+    written = []
+    n = progress.sequence
+    # feeds are kept only if the batch itself was moved in place
+    with ExitStack() as feeds_stack, writer, background or nullcontext():
+        progress.checkpoint["tmp"] = writer.tmp_path
+        for feed in feeds:
+            feeds_stack.enter_context(feed)
+        writer.flush()  # checkpoint the start of the run
+        for _, item, _ in replayed:
+            template.item_type_code(item.loan_restriction)
+        if saved is not None and feeds:
+            # feeds are not checkpointed, records written before the
+            # interruption are fed to them from the batch as written
+            for data in _batch_records(saved):
+                for feed in feeds:
+                    feed.write(data)
+        if workers > 1:
+            pending = list(rows)
+            items = [item for _, item in pending]
+            progress.reserve_through(n + len(items) - 1)
+            bibs = stats.timed(
+                "generate",
+                generate_bibs_parallel(items, n, workers, fast_marc=fast_marc),
+            )
+            for (row, item), data in zip(pending, bibs):
+                # workers count invalid loan restrictions of their own
+                template.item_type_code(item.loan_restriction)
+                with stats.stage("write"):
+                    write(data, row, item, n)
+                written.append((row, item, n))
+                n += 1
+        else:
+            serializer = MarcSerializer(template) if fast_marc else None
+            for row, item in rows:
+                progress.reserve_through(n)
+                start = perf_counter()
+                try:
+                    if serializer:
+                        data = serializer.serialize(item, n)
+                    else:
+                        data = generate_bib(item, n, template).as_marc()
+                except ValueError as exc:
+                    if progress.checkpoint["on_error"] != "quarantine":
+                        raise
+                    rejects.append((row, item, [str(exc) or "Invalid row."]))
+                    continue
+                generated = perf_counter()
+                write(data, row, item, n)
+                stats.add_time("generate", generated - start)
+                stats.add_time("write", perf_counter() - generated)
+                written.append((row, item, n))
+                n += 1
+        closing = perf_counter()
+    # final flush and move of the batch file in place
+    stats.add_time("write", perf_counter() - closing)
+    stats.count("bytes_written", writer.bytes_written)
+    return written
 
-def verify_data():
-    get_metadata()
-    verify_barcodes()
 
+def _batch_records(saved: Checkpoint) -> Iterator[bytes]:
+    """
+    Yields records of the batch written by the interrupted run of `saved`,
+    skipping records of an earlier batch of the day it continues
+    """
+    from src.control_numbers import control_no_sequence
+    from src.marc_scan import control_field, iter_records
 
-if __name__ == "__main__":
-    try:
-        if len(sys.argv) > 3:
-            print("Invalid command. Too many arguments.")
-        elif sys.argv[1] == "create":
-            run(sys.argv[2])
-        elif sys.argv[1] == "verify":
-            verify_data()
+    if saved["tmp"] is None:
+        return
+    with open(saved["tmp"], "rb") as batch:
+        for _, data in iter_records(batch):
+            sequence = control_no_sequence(control_field(data, "001"))
+            if saved["start"] <= sequence < saved["sequence"]:
+                yield data
+
+
+def _changed_rows(
+    rows: Iterable[tuple[int, Item]],
+    emitted: dict[str, tuple[str, str]],
+    overlays: list[tuple[int, Item, str]],
+    on_error: str,
+    rejects: list[tuple[int, Item, list[str]]],
+    stats: PipelineStats,
+) -> list[tuple[int, Item]]:
+    """
+    Returns rows never crosswalked before. Rows emitted before with the same
+    content are skipped and edited ones collected with their control numbers.
+    All rows are read and edited ones validated before returning, so an
+    invalid edit stops the run (or is quarantined) before the batch is opened.
+    """
+    from src.data_checker import validate_item
+    from src.fingerprints import fingerprint, row_key
+
+    new_rows = []
+    for row, item in rows:
+        key = row_key(item)
+        previous = None if key is None else emitted.get(key)
+        if previous is None:
+            new_rows.append((row, item))
+        elif previous[0] == fingerprint(item):
+            stats.count("rows_unchanged")
+        else:
+            with stats.stage("validate"):
+                errors = validate_item(item)
+            if not errors:
+                overlays.append((row, item, previous[1]))
+            elif on_error == "quarantine":
+                rejects.append((row, item, errors))
+            else:
+                raise ValueError(f"Edited row {row} is invalid: {' '.join(errors)}")
+    return new_rows
+
+
+def _feed_writers(fh_out, formats):
+    """Returns writers of feeds requested with `--format` next to a batch"""
+    import os
+
+    from src.feeds import MarcJsonWriter, MarcXmlWriter
+
+    base = os.path.splitext(fh_out)[0]
+    feeds = []
+    if formats in ("xml", "all"):
+        feeds.append(MarcXmlWriter(f"{base}.xml"))
+    if formats in ("json", "all"):
+        feeds.append(MarcJsonWriter(f"{base}.jsonl"))
+    return feeds
+
+
+def _write_overlays(
+    overlays, fh_out, template, workers=1, fast_marc=False, formats="marc"
+):
+    """
+    Writes bibs of validated edited rows under their control numbers, along
+    with requested feeds. Returns writers of the feeds.
+    """
+    from contextlib import ExitStack
+
+    from src.control_numbers import control_no_sequence
+    from src.marc_serializer import MarcSerializer
+    from src.producer import MarcBatchWriter, generate_bib, generate_bibs_parallel
+
+    items = [item for _, item, _ in overlays]
+    sequences = [control_no_sequence(control_no) for _, _, control_no in overlays]
+    feeds = _feed_writers(fh_out, formats)
+    with ExitStack() as feeds_stack, MarcBatchWriter(fh_out) as writer:
+        for feed in feeds:
+            feeds_stack.enter_context(feed)
+        if workers > 1:
+            # workers count invalid loan restrictions of their own
+            for item in items:
+                template.item_type_code(item.loan_restriction)
+            bibs = generate_bibs_parallel(
+                items, sequences, workers, fast_marc=fast_marc
+            )
+        elif fast_marc:
+            serializer = MarcSerializer(template)
+            bibs = map(serializer.serialize, items, sequences)
         else:
-            print("Invalid command. Use 'create' or 'verify' argument.")
-    except IndexError:
-        print("Invalid command. Missing 'create' or 'verify' argument.")
+            bibs = (
+                generate_bib(item, sequence, template).as_marc()
+                for item, sequence in zip(items, sequences)
+            )
+        for data in bibs:
+            writer.write(data)
+            for feed in feeds:
+                feed.write(data)
+    return feeds
+
+
+def _record_bibs(bibs):
+    """Records barcodes and fingerprints of rows crosswalked to bibs"""
+    from src.barcode_index import BarcodeIndex
+    from src.fingerprints import RowFingerprints
+    from src.producer import _barcodes2list
+
+    with BarcodeIndex() as index, RowFingerprints() as fingerprints:
+        for row, item, control_no in bibs:
+            conflicts = index.record_bib(
+                row, item.barcode, _barcodes2list(item.barcode), control_no
+            )
+            for barcode in conflicts:
+                print(
+                    f"Warning, barcode {barcode} of row {row} is already used "
+                    "by another row, run `verify`."
+                )
+            fingerprints.record(item, control_no)
+
+
+def _quarantine(rows, rejects, stats):
+    """Yields valid rows, collecting invalid ones with their problems"""
+    from src.data_checker import validate_item
+
+    for row, item in rows:
+        with stats.stage("validate"):
+            errors = validate_item(item)
+        if errors:
+            rejects.append((row, item, errors))
+        else:
+            yield row, item
+
+
+def verify_data(
+    max_age: float | None = None,
+    offline: bool = False,
+    against_history: bool = False,
+) -> None:
+    from src.data_checker import verify_barcodes
+    from src.downloader import get_metadata
+
+    get_metadata(max_age=max_age, offline=offline)
+    verify_barcodes(against_history=against_history)
+
+
+def validate_data(max_age: float | None = None, offline: bool = False) -> None:
+    from src.data_checker import validate_rows
+    from src.downloader import get_metadata
+
+    get_metadata(max_age=max_age, offline=offline)
+    validate_rows()
+
+
+def index_batches() -> None:
+    from src.history import HistoryIndex
+
+    with HistoryIndex() as history:
+        scanned = history.refresh()
+        files, records = history.counts()
+    print(f"Indexed {records} records in {files} files ({scanned} rescanned).")
+
+
+def lookup(key: str, raw: bool = False) -> None:
+    import sys
+
+    from src.control_numbers import CONTROL_NO_PREFIX
+    from src.history import HistoryIndex
+    from src.marc_scan import read_record
+
+    with HistoryIndex() as history:
+        if key.startswith(CONTROL_NO_PREFIX):
+            locations = history.locate(control_no=key)
+        else:
+            locations = history.locate(barcode=key)
+    if not locations:
+        print(f"No record found for {key}, run `index` after adding batches.")
+        return
+    for file, offset, length in locations:
+        try:
+            data = read_record(file, offset, length)
+        except (OSError, ValueError):
+            raise ValueError(f"Index of {file} is out of date, run `index`")
+        if raw:
+            sys.stdout.flush()
+            sys.stdout.buffer.write(data)
+            continue
+        from pymarc import Record  # type: ignore
+
+        print(f"{file} at offset {offset} ({length} bytes):")
+        print(Record(data=data, to_unicode=True, force_utf8=True))
+
+
+def merge(fh_out: str | None = None) -> None:
+    import glob
+    import os
+
+    from src.history import HISTORY_PATTERN
+    from src.merge import merge_batches
+    from src.producer import _date_today
+
+    if fh_out is None:
+        fh_out = f"out/merged-{_date_today()}.mrc"
+    files = sorted(glob.glob(HISTORY_PATTERN))
+    if os.path.abspath(fh_out) in [os.path.abspath(file) for file in files]:
+        raise ValueError(f"Output file {fh_out} is one of the merged batches")
+    read, written = merge_batches(files, fh_out)
+    print(
+        f"Merged {written} records from {len(files)} files into {fh_out}, "
+        f"dropped {read - written} superseded records."
+    )
+
+
+def _positive_int(value: str) -> int:
+    try:
+        number = int(value)
     except ValueError:
-        print("Invalid call #. Provide a number after 'create' argument.")
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value!r} is not a positive integer")
+    return number
+
+
+def main(args: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="tool_bibs.py",
+        description="Crosswalk from google sheets to MARC21 for BPL tool library.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    metadata_parser = argparse.ArgumentParser(add_help=False)
+    metadata_parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="use local copy of the sheet without downloading it",
+    )
+    metadata_parser.add_argument(
+        "--max-age",
+        type=float,
+        metavar="SECONDS",
+        help="reuse local copy of the sheet if downloaded less than SECONDS ago",
+    )
+
+    create_parser = subparsers.add_parser(
+        "create", parents=[metadata_parser], help="create MARC21 bibs"
+    )
+    create_parser.add_argument(
+        "start_sequence",
+        type=int,
+        nargs="?",
+        help=(
+            "next control # sequence, e.g. 24 (default: next free one found " "in out/)"
+        ),
+    )
+    create_parser.add_argument(
+        "--workers",
+        type=_positive_int,
+        default=1,
+        help="number of processes used to generate bibs (default: 1)",
+    )
+    create_parser.add_argument(
+        "--fast-marc",
+        action="store_true",
+        help="serialize MARC21 directly instead of building pymarc records",
+    )
+    create_parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="print time spent in each stage of the crosswalk",
+    )
+    create_parser.add_argument(
+        "--on-error",
+        choices=["abort", "quarantine"],
+        default="abort",
+        help=(
+            "abort the run on the first invalid row (default) or skip invalid "
+            "rows saving them in out/rejects-{date}.csv"
+        ),
+    )
+    create_parser.add_argument(
+        "--pipelined",
+        action="store_true",
+        help="create bibs while the sheet downloads",
+    )
+    create_parser.add_argument(
+        "--changed-only",
+        action="store_true",
+        help=(
+            "skip rows crosswalked before without changes and re-emit edited "
+            "ones as overlays"
+        ),
+    )
+    create_parser.add_argument(
+        "--format",
+        choices=["marc", "xml", "json", "all"],
+        default="marc",
+        help=(
+            "also write bibs as MARCXML (out/tool-bibs-{date}.xml), "
+            "line-delimited MARC-in-JSON (out/tool-bibs-{date}.jsonl) or both "
+            "(default: MARC21 only)"
+        ),
+    )
+    create_parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="continue an interrupted run where it stopped",
+    )
+    create_parser.add_argument(
+        "--discard",
+        action="store_true",
+        help="drop an interrupted run, giving back its unused control #s",
+    )
+
+    verify_parser = subparsers.add_parser(
+        "verify",
+        parents=[metadata_parser],
+        help="check sheet for duplicate barcodes",
+    )
+    verify_parser.add_argument(
+        "--against-history",
+        action="store_true",
+        help="also check new rows against barcodes in previous .mrc files",
+    )
+
+    subparsers.add_parser(
+        "validate",
+        parents=[metadata_parser],
+        help="report all problems of rows marked for processing",
+    )
+
+    subparsers.add_parser(
+        "index",
+        help="index records of MARC21 files in out/ for lookups",
+    )
+
+    lookup_parser = subparsers.add_parser(
+        "lookup", help="print record with a control # or item barcode"
+    )
+    lookup_parser.add_argument(
+        "key", help="control #, e.g. bkl-tll-0000024, or barcode"
+    )
+    lookup_parser.add_argument(
+        "--raw", action="store_true", help="write the record as MARC21"
+    )
+
+    merge_parser = subparsers.add_parser(
+        "merge",
+        help="combine all batches in out/ keeping the latest version of each bib",
+    )
+    merge_parser.add_argument(
+        "--output",
+        metavar="PATH",
+        help="merged MARC21 file (default: out/merged-{date}.mrc)",
+    )
+
+    opts = parser.parse_args(args)
+    if opts.command == "create" and opts.resume and opts.start_sequence is not None:
+        create_parser.error("start_sequence cannot be used with --resume")
+    if opts.command == "create" and opts.discard:
+        if opts.resume or opts.start_sequence is not None:
+            create_parser.error("--discard cannot be used with --resume or a sequence")
+    try:
+        if opts.command == "create" and opts.discard:
+            discard()
+        elif opts.command == "create":
+            run(
+                start_sequence=opts.start_sequence,
+                workers=opts.workers,
+                max_age=opts.max_age,
+                offline=opts.offline,
+                fast_marc=opts.fast_marc,
+                show_stats=opts.stats,
+                resume=opts.resume,
+                on_error=opts.on_error,
+                pipelined=opts.pipelined,
+                changed_only=opts.changed_only,
+                formats=opts.format,
+            )
+        elif opts.command == "verify":
+            verify_data(opts.max_age, opts.offline, opts.against_history)
+        elif opts.command == "validate":
+            validate_data(opts.max_age, opts.offline)
+        elif opts.command == "index":
+            index_batches()
+        elif opts.command == "lookup":
+            lookup(opts.key, opts.raw)
+        elif opts.command == "merge":
+            merge(opts.output)
     except Exception as e:
         print(f"A error occurred: {e}.")
+
+
+if __name__ == "__main__":
+    main()